@@ -0,0 +1,48 @@
+# Add composite indexes for report and graph queries
+# Revision ID: 003
+# Revises: 002
+# Create Date: 2026-02-02 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build concurrently so existing scans stay readable/writable during the migration
+    with op.get_context().autocommit_block():
+        # Report: top domains by bytes for a scan
+        op.create_index(
+            'ix_domain_aggregates_scan_bytes',
+            'domain_aggregates',
+            ['scan_id', sa.text('bytes DESC')],
+            postgresql_concurrently=True
+        )
+        # Graph/compare: first-party vs third-party rows for a scan
+        op.create_index(
+            'ix_domain_aggregates_scan_tp',
+            'domain_aggregates',
+            ['scan_id', 'is_third_party'],
+            postgresql_concurrently=True
+        )
+        # Graph: cookie counts grouped by domain
+        op.create_index(
+            'ix_cookies_scan_domain',
+            'cookies',
+            ['scan_id', 'domain'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_cookies_scan_domain', table_name='cookies', postgresql_concurrently=True)
+        op.drop_index('ix_domain_aggregates_scan_tp', table_name='domain_aggregates', postgresql_concurrently=True)
+        op.drop_index('ix_domain_aggregates_scan_bytes', table_name='domain_aggregates', postgresql_concurrently=True)
@@ -0,0 +1,29 @@
+# Add precomputed graph summary columns to scans
+# Revision ID: 004
+# Revises: 003
+# Create Date: 2026-02-03 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable so existing scans keep working; the API falls back to aggregating
+    op.add_column('scans', sa.Column('first_party_request_count', sa.Integer(), nullable=True))
+    op.add_column('scans', sa.Column('first_party_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('scans', sa.Column('graph_cache', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('scans', 'graph_cache')
+    op.drop_column('scans', 'first_party_bytes')
+    op.drop_column('scans', 'first_party_request_count')
@@ -0,0 +1,33 @@
+# Replace the scans status index with a status + newest-first composite
+# Revision ID: 006
+# Revises: 005
+# Create Date: 2026-02-05 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The composite serves status-only lookups too, so the old index is dropped
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_scans_status_created',
+            'scans',
+            ['status', sa.text('created_at DESC')],
+            postgresql_concurrently=True
+        )
+        op.drop_index('ix_scans_status', table_name='scans', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_scans_status', 'scans', ['status'], postgresql_concurrently=True)
+        op.drop_index('ix_scans_status_created', table_name='scans', postgresql_concurrently=True)
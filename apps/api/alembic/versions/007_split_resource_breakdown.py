@@ -0,0 +1,66 @@
+# Store domain resource breakdown as fixed integer columns instead of JSON
+# Revision ID: 007
+# Revises: 006
+# Create Date: 2026-02-06 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Column -> Playwright resource types folded into it; anything else is "other"
+KIND_SOURCES = {
+    'script_count': ('script',),
+    'image_count': ('image',),
+    'xhr_count': ('xhr', 'fetch'),
+    'font_count': ('font',),
+    'css_count': ('css', 'stylesheet'),
+    'media_count': ('media',),
+}
+
+
+def _sum_keys(keys, negate=False) -> str:
+    key_list = ', '.join(f"'{key}'" for key in keys)
+    condition = f"key NOT IN ({key_list})" if negate else f"key IN ({key_list})"
+    return (
+        "(SELECT COALESCE(SUM(value::text::int), 0) "
+        f"FROM json_each(resource_breakdown) WHERE {condition})"
+    )
+
+
+def upgrade() -> None:
+    for name in list(KIND_SOURCES) + ['other_count']:
+        op.add_column(
+            'domain_aggregates',
+            sa.Column(name, sa.Integer(), nullable=False, server_default='0')
+        )
+    
+    known_keys = [key for keys in KIND_SOURCES.values() for key in keys]
+    assignments = [f"{name} = {_sum_keys(keys)}" for name, keys in KIND_SOURCES.items()]
+    assignments.append(f"other_count = {_sum_keys(known_keys, negate=True)}")
+    op.execute(f"UPDATE domain_aggregates SET {', '.join(assignments)}")
+    
+    op.drop_column('domain_aggregates', 'resource_breakdown')
+
+
+def downgrade() -> None:
+    op.add_column(
+        'domain_aggregates',
+        sa.Column('resource_breakdown', postgresql.JSON(astext_type=sa.Text()), nullable=True)
+    )
+    pairs = ', '.join(
+        f"'{name[:-len('_count')]}', NULLIF({name}, 0)"
+        for name in list(KIND_SOURCES) + ['other_count']
+    )
+    op.execute(f"UPDATE domain_aggregates SET resource_breakdown = json_strip_nulls(json_build_object({pairs}))")
+    op.alter_column('domain_aggregates', 'resource_breakdown', nullable=False)
+    
+    for name in ['other_count'] + list(reversed(list(KIND_SOURCES))):
+        op.drop_column('domain_aggregates', name)
@@ -0,0 +1,59 @@
+# Intern cookie and domain aggregate domain names in a shared domains table
+# Revision ID: 008
+# Revises: 007
+# Create Date: 2026-02-07 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INTERNED_TABLES = ('domain_aggregates', 'cookies')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'domains',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.UniqueConstraint('name', name='uq_domains_name')
+    )
+    op.execute("""
+        INSERT INTO domains (name)
+        SELECT domain FROM domain_aggregates
+        UNION
+        SELECT domain FROM cookies
+    """)
+
+    op.drop_index('ix_cookies_scan_domain', table_name='cookies')
+    for table in INTERNED_TABLES:
+        op.add_column(table, sa.Column('domain_id', sa.Integer(), nullable=True))
+        op.execute(f"""
+            UPDATE {table} t SET domain_id = d.id
+            FROM domains d WHERE d.name = t.domain
+        """)
+        op.alter_column(table, 'domain_id', nullable=False)
+        op.create_foreign_key(f'{table}_domain_id_fkey', table, 'domains', ['domain_id'], ['id'])
+        op.drop_column(table, 'domain')
+    op.create_index('ix_cookies_scan_domain', 'cookies', ['scan_id', 'domain_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cookies_scan_domain', table_name='cookies')
+    for table in INTERNED_TABLES:
+        op.add_column(table, sa.Column('domain', sa.Text(), nullable=True))
+        op.execute(f"""
+            UPDATE {table} t SET domain = d.name
+            FROM domains d WHERE d.id = t.domain_id
+        """)
+        op.alter_column(table, 'domain', nullable=False)
+        op.drop_constraint(f'{table}_domain_id_fkey', table, type_='foreignkey')
+        op.drop_column(table, 'domain_id')
+    op.create_index('ix_cookies_scan_domain', 'cookies', ['scan_id', 'domain'])
+    op.drop_table('domains')
@@ -0,0 +1,44 @@
+# Store timestamps as timestamptz and let Postgres fill created_at
+# Revision ID: 009
+# Revises: 008
+# Create Date: 2026-02-08 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Existing naive values were written with datetime.utcnow()
+TIMESTAMP_COLUMNS = {
+    'scans': ('created_at', 'started_at', 'finished_at'),
+    'artifacts': ('created_at',),
+    'fingerprinting_detections': ('created_at',),
+}
+
+
+def upgrade() -> None:
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            op.alter_column(
+                table, column,
+                type_=sa.DateTime(timezone=True),
+                postgresql_using=f"{column} AT TIME ZONE 'UTC'"
+            )
+        op.alter_column(table, 'created_at', server_default=sa.func.now())
+
+
+def downgrade() -> None:
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        op.alter_column(table, 'created_at', server_default=None)
+        for column in columns:
+            op.alter_column(
+                table, column,
+                type_=sa.DateTime(),
+                postgresql_using=f"{column} AT TIME ZONE 'UTC'"
+            )
@@ -0,0 +1,39 @@
+# Make cookies unique per scan by name/domain/path so the worker can upsert
+# Revision ID: 010
+# Revises: 009
+# Create Date: 2026-02-09 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '010'
+down_revision: Union[str, None] = '009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep one row of any duplicates recorded before the constraint existed
+    op.execute("""
+        DELETE FROM cookies c USING cookies d
+        WHERE c.scan_id = d.scan_id AND c.name = d.name
+          AND c.domain_id = d.domain_id AND c.path = d.path
+          AND c.ctid > d.ctid
+    """)
+    # Build the index concurrently, then attach it as the constraint
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_cookie_scope',
+            'cookies',
+            ['scan_id', 'name', 'domain_id', 'path'],
+            unique=True,
+            postgresql_concurrently=True
+        )
+    op.execute("ALTER TABLE cookies ADD CONSTRAINT uq_cookie_scope UNIQUE USING INDEX uq_cookie_scope")
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_cookie_scope', 'cookies', type_='unique')
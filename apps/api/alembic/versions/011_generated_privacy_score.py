@@ -0,0 +1,65 @@
+# Compute scans.privacy_score in Postgres as a stored generated column
+# Revision ID: 011
+# Revises: 010
+# Create Date: 2026-02-10 00:00:00.000000
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '011'
+down_revision: Union[str, None] = '010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _capped_penalty(column, points, cap) -> str:
+    return f"CASE WHEN {column} * {points} > {cap} THEN {cap} ELSE {column} * {points} END"
+
+
+# Deductions the worker's calculate_privacy_score applied, minus trackers
+BASE_PENALTY_SQL = " + ".join([
+    _capped_penalty("third_party_domains", 3, 30),
+    _capped_penalty("cookies_set", 2, 25),
+    _capped_penalty("localstorage_keys", 3, 15),
+    "CASE WHEN indexeddb_present THEN 10 ELSE 0 END",
+    _capped_penalty("fingerprinting_count", 8, 25),
+])
+PENALTY_SQL = f"{BASE_PENALTY_SQL} + {_capped_penalty('tracker_domains', 10, 20)}"
+PRIVACY_SCORE_SQL = (
+    f"CASE WHEN status = 'completed' AND {PENALTY_SQL} < 100 "
+    f"THEN 100 - ({PENALTY_SQL}) ELSE 0 END"
+)
+
+
+def upgrade() -> None:
+    op.add_column('scans', sa.Column('tracker_domains', sa.Integer(), nullable=True))
+    op.add_column('scans', sa.Column('fingerprinting_count', sa.Integer(), nullable=True))
+    op.execute("""
+        UPDATE scans s SET fingerprinting_count = (
+            SELECT count(*) FROM fingerprinting_detections f WHERE f.scan_id = s.id
+        )
+    """)
+    # The tracker list only exists at scan time, so recover the tracker count
+    # from the stored score: the smallest count (0-2, the penalty caps at 20)
+    # that reproduces it, which keeps every existing score unchanged
+    op.execute(f"""
+        UPDATE scans SET tracker_domains = CASE
+            WHEN status <> 'completed' THEN 0
+            WHEN privacy_score > 0 THEN GREATEST(0, LEAST(2, (100 - ({BASE_PENALTY_SQL}) - privacy_score) / 10))
+            ELSE 2
+        END
+    """)
+    op.drop_column('scans', 'privacy_score')
+    op.add_column('scans', sa.Column(
+        'privacy_score', sa.Integer(), sa.Computed(PRIVACY_SCORE_SQL, persisted=True)
+    ))
+
+
+def downgrade() -> None:
+    # DROP EXPRESSION keeps the computed values as a plain column
+    op.execute("ALTER TABLE scans ALTER COLUMN privacy_score DROP EXPRESSION")
+    op.drop_column('scans', 'fingerprinting_count')
+    op.drop_column('scans', 'tracker_domains')
@@ -0,0 +1,28 @@
+# Short-lived Redis cache for the scan polling endpoints.
+import os
+from typing import Optional, Union
+import redis
+from config import settings
+
+# Disabled during testing, like the rate limiter
+CACHE_ENABLED = os.getenv("TESTING") != "true"
+
+redis_client = redis.Redis.from_url(settings.redis_url, socket_timeout=0.5)
+
+
+def get_cached(key: str) -> Optional[bytes]:
+    if not CACHE_ENABLED:
+        return None
+    try:
+        return redis_client.get(key)
+    except redis.RedisError:
+        return None  # Cache is best-effort; fall back to the database
+
+
+def set_cached(key: str, body: Union[str, bytes], ttl: int = settings.response_cache_ttl) -> None:
+    if not CACHE_ENABLED:
+        return
+    try:
+        redis_client.set(key, body, ex=ttl)
+    except redis.RedisError:
+        pass
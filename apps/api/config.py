@@ -1,4 +1,5 @@
 # Configuration settings for the API application.
+from typing import List
 from pydantic_settings import BaseSettings
 
 
@@ -13,6 +14,23 @@ class Settings(BaseSettings):
     s3_bucket: str = "artifacts"
     s3_public_base: str = "http://localhost:9000/artifacts"
     
+    # CORS: explicit production origins (JSON list) plus a local-dev pattern
+    cors_origins: List[str] = []
+    cors_origin_regex: str = r"^https?://(localhost|127\.0\.0\.1)(:\d+)?$"
+    
+    # Connection pool sizing, per API process (the threadpool is sized to match).
+    # Kept small so several uvicorn workers/replicas fit under Postgres'
+    # max_connections; raise DB_POOL_SIZE/DB_MAX_OVERFLOW per deployment with
+    # (pool + overflow) * processes below the server's connection limit
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 10
+    db_pool_recycle: int = 1800
+    db_statement_timeout_ms: int = 30000
+    
+    # Seconds a cached status/report/graph response stays valid
+    response_cache_ttl: int = 2
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -3,15 +3,28 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
 
+# Per-connection settings; sessions run in UTC so timestamps read through the
+# ORM and those rendered by SQL (the report JSON) agree regardless of the
+# server's TimeZone
+CONNECTION_OPTIONS = f"-c statement_timeout={settings.db_statement_timeout_ms} -c timezone=UTC"
+
 # Create database engine
 engine = create_engine(
     settings.database_url,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
     pool_pre_ping=True,
+    pool_use_lifo=True,  # reuse warm connections; extras idle out and get recycled
+    connect_args={"options": CONNECTION_OPTIONS},
+    query_cache_size=1024,
+    insertmanyvalues_page_size=1000,
     echo=False
 )
 
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create session factory (objects stay loaded after commit instead of re-SELECTing)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create declarative base for models
 Base = declarative_base()
@@ -1,24 +1,37 @@
 # FastAPI application for Privacy Footprint Explorer API.
+import json
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, Request
+from functools import lru_cache
+from typing import List, Optional, Union
+import orjson
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
+from pydantic import BaseModel, ValidationError
 import tldextract
+from anyio import to_thread
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+from config import settings
 from database import get_db, engine
-from models import Base, Scan, DomainAggregate, Cookie, StorageSummary, Artifact
+from models import Base, Scan, Domain, DomainAggregate, Cookie, RESOURCE_KINDS
 from schemas import (
     ScanCreateRequest, ScanCreateResponse, ScanStatus, ScanReport,
     DomainAggregateResponse, CookieResponse, StorageSummaryResponse,
     ArtifactResponse, GraphResponse, GraphNode, GraphEdge,
-    CompareRequest, CompareDelta, ScanListItem, FingerprintingDetectionResponse
+    CompareRequest, CompareDelta, ScanListItem, FingerprintingDetectionResponse,
+    SCAN_CREATE_ADAPTER
 )
-from tasks import celery_app
+from tasks import enqueue_scans
+from cache import get_cached, set_cached
+from shared.scan_cache import scan_cache_key
 
 # Create database tables (skip if testing)
 import os
@@ -28,91 +41,289 @@ if os.getenv("TESTING") != "true":
     except Exception:
         pass  # Database may not be available yet
 
-# Initialize rate limiter (disabled during testing)
-limiter = Limiter(key_func=get_remote_address, enabled=(os.getenv("TESTING") != "true"))
+# Shared extractor so the public suffix list is loaded once per process
+_tld_extract = tldextract.TLDExtract()
 
-app = FastAPI(title="Privacy Footprint Explorer API", version="1.0.0")
+
+@lru_cache(maxsize=100_000)
+def base_domain_of(host: str) -> str:
+    # eTLD+1 for a host; memoized since many cookies share a domain
+    # (IPs and bare suffixes lack one of the parts and are returned whole,
+    # matching the worker's registered_domain)
+    extracted = _tld_extract(host)
+    return '.'.join(part for part in (extracted.domain, extracted.suffix) if part)
+
+
+# Tracker list used to color graph nodes
+TRACKER_LIST_PATH = '/app/tracker_lists/default.json'
+
+
+def load_tracker_domains(path: str = TRACKER_LIST_PATH) -> frozenset:
+    # Missing or malformed lists just mean no node is flagged as a tracker
+    try:
+        with open(path, 'r') as f:
+            return frozenset(json.load(f))
+    except Exception:
+        return frozenset()
+
+
+# Loaded once at import instead of on every graph request
+TRACKER_DOMAINS = load_tracker_domains()
+
+
+def is_tracker_domain(domain: str) -> bool:
+    # A domain is a tracker if it or any parent domain is listed (the same
+    # rule the worker applies when counting tracker_domains)
+    while domain:
+        if domain in TRACKER_DOMAINS:
+            return True
+        domain = domain.partition('.')[2]
+    return False
+
+# Initialize rate limiter (disabled during testing); counters live in Redis so
+# every API worker shares the same per-IP budget. Like the response cache,
+# Redis is best-effort here: while it is unreachable each process enforces
+# the limits from its own in-memory counters instead of failing requests
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=settings.redis_url,
+    storage_options={"socket_timeout": 0.5, "socket_connect_timeout": 0.5},
+    strategy="moving-window",
+    in_memory_fallback_enabled=True,
+    enabled=(os.getenv("TESTING") != "true")
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # DB-bound endpoints are plain `def` and run in the threadpool; size it to
+    # the connection pool so threads don't queue on connections (or vice versa)
+    to_thread.current_default_thread_limiter().total_tokens = (
+        settings.db_pool_size + settings.db_max_overflow
+    )
+    yield
+
+
+app = FastAPI(
+    title="Privacy Footprint Explorer API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    # No schema or docs routes under test; without openapi_url FastAPI skips
+    # /docs and /redoc too, so every request matches against fewer routes
+    openapi_url=None if os.getenv("TESTING") == "true" else "/openapi.json"
+)
 
 # Add rate limiter state to app
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-# Configure CORS
+# Configure CORS (credentials only when concrete origins are configured)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify exact origins
-    allow_credentials=True,
+    allow_origins=settings.cors_origins,
+    allow_origin_regex=settings.cors_origin_regex,
+    allow_credentials=bool(settings.cors_origins),
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
+def cached_response(key: str) -> Optional[Response]:
+    # Serve a recently rendered response while a scan is being polled
+    body = get_cached(key)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json")
+
+
+def cache_body(key: str, body: Union[str, bytes]) -> Response:
+    set_cached(key, body)
+    return Response(content=body, media_type="application/json")
+
+
+def cache_response(key: str, model: BaseModel) -> Response:
+    return cache_body(key, model.model_dump_json())
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "privacy-api"}
 
 
+async def scan_create_body(request: Request) -> ScanCreateRequest:
+    # Validate the raw JSON body directly instead of json.loads + model_validate
+    try:
+        return SCAN_CREATE_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
 @app.post("/api/scans", response_model=ScanCreateResponse)
 @limiter.limit("30/minute")
-async def create_scans(request: Request, scan_request: ScanCreateRequest, db: Session = Depends(get_db)):
+def create_scans(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    scan_request: ScanCreateRequest = Depends(scan_create_body),
+    db: Session = Depends(get_db)
+):
     # Rate limit: 30 requests per minute per IP (increased for better UX)
     # Extract base domain (eTLD+1)
-    extracted = tldextract.extract(scan_request.url)
+    extracted = _tld_extract(scan_request.url)
     base_domain = f"{extracted.domain}.{extracted.suffix}"
     
     if not extracted.domain or not extracted.suffix:
         raise HTTPException(status_code=400, detail="Invalid URL: cannot extract domain")
     
-    scan_ids = []
-    
-    for profile in scan_request.profiles:
-        # Create scan record
-        scan = Scan(
+    # Create all scan records in a single transaction (IDs are generated
+    # client-side and server defaults come back via RETURNING, so no refresh
+    # is needed to read them back)
+    scans = [
+        Scan(
             id=uuid.uuid4(),
             url=scan_request.url,
             base_domain=base_domain,
             profile=profile,
-            status='queued',
-            created_at=datetime.utcnow()
-        )
-        
-        db.add(scan)
-        db.commit()
-        db.refresh(scan)
-        
-        scan_ids.append(scan.id)
-        
-        # Enqueue Celery task
-        strict_config_dict = scan_request.strict_config.model_dump() if profile == 'strict' else {}
-        celery_app.send_task(
-            "run_scan",
-            args=[str(scan.id), strict_config_dict]
+            status='queued'
         )
+        for profile in scan_request.profiles
+    ]
+    jobs = [(scan.id, scan.profile) for scan in scans]
+    
+    db.add_all(scans)
+    db.commit()
     
-    return ScanCreateResponse(scan_ids=scan_ids)
+    # Enqueue Celery tasks after the response is sent, once the rows are committed
+    # Strict settings travel as plain task args; other profiles use the defaults
+    strict_config = scan_request.strict_config
+    background_tasks.add_task(enqueue_scans, [
+        (str(scan_id), strict_config.block_third_party, strict_config.allowlist_domains)
+        if profile == 'strict' else (str(scan_id), False, [])
+        for scan_id, profile in jobs
+    ])
+    
+    return ScanCreateResponse(
+        scan_ids=[scan_id for scan_id, _ in jobs],
+        scans=[ScanListItem.model_validate(scan) for scan in scans]
+    )
+
+
+# Columns serialized by ScanStatus, selected directly instead of loading ORM objects
+STATUS_COLUMNS = tuple(getattr(Scan, field) for field in ScanStatus.model_fields)
+
+# Built once so the hot polling path reuses the engine's compiled-statement cache
+STATUS_BY_ID = select(*STATUS_COLUMNS).where(Scan.id == bindparam("scan_id"))
 
 
 @app.get("/api/scans/{scan_id}", response_model=ScanStatus)
 @limiter.limit("360/minute")
-async def get_scan_status(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
+def get_scan_status(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
     # Rate limit: 360 requests per minute per IP (very high for 500ms polling)
-    scan = db.query(Scan).filter(Scan.id == scan_id).first()
+    cache_key = scan_cache_key(scan_id, "status")
+    cached = cached_response(cache_key)
+    if cached is not None:
+        return cached
     
-    if not scan:
+    row = db.execute(STATUS_BY_ID, {"scan_id": scan_id}).first()
+    
+    if not row:
         raise HTTPException(status_code=404, detail="Scan not found")
     
-    return scan
+    return cache_response(cache_key, ScanStatus(**row._mapping))
 
 
-@app.get("/api/scans/{scan_id}/report", response_model=ScanReport)
-@limiter.limit("600/minute")
-async def get_scan_report(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
-    # Rate limit: 600 requests per minute per IP (ultra-high for 250ms polling)
-    # Returns top 50 domains by bytes and top 50 cookies
-    scan = db.query(Scan).filter(Scan.id == scan_id).first()
+def timestamp_json_sql(column: str, utc: bool = True) -> str:
+    # Renders a timestamp the way pydantic serializes it: ISO 8601, fractional
+    # seconds only when non-zero, and "Z" for timestamptz columns (read in UTC)
+    value = f"({column} AT TIME ZONE 'UTC')" if utc else column
+    return (
+        f"to_char({value}, 'YYYY-MM-DD\"T\"HH24:MI:SS')"
+        f" || CASE WHEN date_part('microseconds', {value})::int % 1000000 = 0"
+        f" THEN '' ELSE to_char({value}, '.US') END"
+        + (" || 'Z'" if utc else "")
+    )
+
+
+def json_object_sql(alias: str, schema, overrides: Optional[dict] = None) -> str:
+    # json_build_object('field', alias.field, ...) for a response schema's
+    # fields; datetime fields are formatted explicitly rather than left to
+    # Postgres' session-dependent text rendering
+    overrides = overrides or {}
+    columns = []
+    for field, info in schema.model_fields.items():
+        column = f'{alias}.{field}'
+        if info.annotation in (datetime, Optional[datetime]):
+            column = timestamp_json_sql(column)
+        columns.append(f"'{field}', {overrides.get(field, column)}")
+    return "json_build_object({})".format(", ".join(columns))
+
+
+# Resource breakdown dict rebuilt from the per-kind count columns (zeros omitted)
+RESOURCE_BREAKDOWN_SQL = "json_strip_nulls(json_build_object({}))".format(
+    ", ".join(f"'{kind}', NULLIF(d.{kind}_count, 0)" for kind in RESOURCE_KINDS)
+)
+
+# Postgres builds the complete ScanReport JSON (same shape, limits and value
+# formatting as the ORM path) so the API only forwards the text
+REPORT_JSON_SQL = text(f"""
+    SELECT json_build_object(
+        'scan', {json_object_sql('s', ScanStatus)},
+        'domain_aggregates', (
+            SELECT COALESCE(json_agg({json_object_sql(
+                'd', DomainAggregateResponse, {'resource_breakdown': RESOURCE_BREAKDOWN_SQL}
+            )} ORDER BY d.bytes DESC), '[]')
+            FROM (
+                SELECT da.*, dn.name AS domain FROM domain_aggregates da JOIN domains dn ON dn.id = da.domain_id
+                WHERE da.scan_id = s.id ORDER BY da.bytes DESC LIMIT 50
+            ) d
+        ),
+        'cookies', (
+            SELECT COALESCE(json_agg({json_object_sql(
+                'c', CookieResponse, {'expires_at': timestamp_json_sql('c.expires_at', utc=False)}
+            )}), '[]')
+            FROM (
+                SELECT ck.*, dn.name AS domain FROM cookies ck JOIN domains dn ON dn.id = ck.domain_id
+                WHERE ck.scan_id = s.id LIMIT 50
+            ) c
+        ),
+        'storage_summary', (
+            SELECT {json_object_sql('ss', StorageSummaryResponse)}
+            FROM storage_summary ss WHERE ss.scan_id = s.id
+        ),
+        'artifacts', (
+            SELECT COALESCE(json_agg({json_object_sql('a', ArtifactResponse)}), '[]')
+            FROM artifacts a WHERE a.scan_id = s.id
+        ),
+        'fingerprinting_detections', (
+            SELECT COALESCE(json_agg({json_object_sql('f', FingerprintingDetectionResponse)}), '[]')
+            FROM fingerprinting_detections f WHERE f.scan_id = s.id
+        )
+    )::text
+    FROM scans s
+    WHERE s.id = :scan_id
+""")
+
+
+def load_scan_report(db: Session, scan_id: uuid.UUID) -> Optional[ScanReport]:
+    # Storage summary is joined onto the scan row; artifacts and fingerprinting
+    # detections are loaded with one IN query each instead of separate lookups.
+    # Any other relationship access raises rather than lazy-loading (N+1).
+    scan = (
+        db.query(Scan)
+        .options(
+            joinedload(Scan.storage_summary),
+            selectinload(Scan.artifacts),
+            selectinload(Scan.fingerprinting_detections),
+            raiseload("*")
+        )
+        .filter(Scan.id == scan_id)
+        .first()
+    )
     
     if not scan:
-        raise HTTPException(status_code=404, detail="Scan not found")
+        return None
     
     # Get domain aggregates (top 50 by bytes)
     domain_aggregates = (
@@ -131,76 +342,99 @@ async def get_scan_report(request: Request, scan_id: uuid.UUID, db: Session = De
         .all()
     )
     
-    # Get storage summary
-    storage_summary = (
-        db.query(StorageSummary)
-        .filter(StorageSummary.scan_id == scan_id)
-        .first()
-    )
+    # Validate the whole report from the ORM objects in one pydantic-core pass
+    return ScanReport.model_validate({
+        "scan": scan,
+        "domain_aggregates": domain_aggregates,
+        "cookies": cookies,
+        "storage_summary": scan.storage_summary,
+        "artifacts": scan.artifacts,
+        "fingerprinting_detections": scan.fingerprinting_detections
+    }, from_attributes=True)
+
+
+@app.get("/api/scans/{scan_id}/report", response_model=ScanReport)
+@limiter.limit("600/minute")
+def get_scan_report(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
+    # Rate limit: 600 requests per minute per IP (ultra-high for 250ms polling)
+    # Returns top 50 domains by bytes and top 50 cookies
+    cache_key = scan_cache_key(scan_id, "report")
+    cached = cached_response(cache_key)
+    if cached is not None:
+        return cached
     
-    # Get artifacts
-    artifacts = (
-        db.query(Artifact)
-        .filter(Artifact.scan_id == scan_id)
-        .all()
-    )
+    # On Postgres the report is assembled as JSON in a single query
+    if db.get_bind().dialect.name == "postgresql":
+        report_json = db.execute(REPORT_JSON_SQL, {"scan_id": scan_id}).scalar()
+        if report_json is None:
+            raise HTTPException(status_code=404, detail="Scan not found")
+        return cache_body(cache_key, report_json)
     
-    # Get fingerprinting detections
-    from models import FingerprintingDetection
-    fingerprinting_detections = (
-        db.query(FingerprintingDetection)
-        .filter(FingerprintingDetection.scan_id == scan_id)
-        .all()
-    )
+    report = load_scan_report(db, scan_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
     
-    return ScanReport(
-        scan=ScanStatus.model_validate(scan),
-        domain_aggregates=[DomainAggregateResponse.model_validate(d) for d in domain_aggregates],
-        cookies=[CookieResponse.model_validate(c) for c in cookies],
-        storage_summary=StorageSummaryResponse.model_validate(storage_summary) if storage_summary else None,
-        artifacts=[ArtifactResponse.model_validate(a) for a in artifacts],
-        fingerprinting_detections=[FingerprintingDetectionResponse.model_validate(f) for f in fingerprinting_detections]
-    )
+    return cache_response(cache_key, report)
 
 
 @app.get("/api/scans/{scan_id}/graph", response_model=GraphResponse)
 @limiter.limit("240/minute")
-async def get_scan_graph(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
+def get_scan_graph(request: Request, scan_id: uuid.UUID, db: Session = Depends(get_db)):
     # Rate limit: 240 requests per minute per IP (doubled for better UX)
+    cache_key = scan_cache_key(scan_id, "graph")
+    cached = cached_response(cache_key)
+    if cached is not None:
+        return cached
+    
     scan = db.query(Scan).filter(Scan.id == scan_id).first()
     
     if not scan:
         raise HTTPException(status_code=404, detail="Scan not found")
     
-    # Get domain aggregates
-    domain_aggregates = (
+    # Completed scans carry a graph precomputed by the worker
+    if scan.graph_cache is not None:
+        return cache_body(cache_key, orjson.dumps(scan.graph_cache))
+    
+    # First-party totals are precomputed too, or summed in the database
+    if scan.first_party_request_count is not None:
+        first_party_requests = scan.first_party_request_count
+        first_party_bytes = scan.first_party_bytes
+    else:
+        first_party_requests, first_party_bytes = (
+            db.query(
+                func.coalesce(func.sum(DomainAggregate.request_count), 0),
+                func.coalesce(func.sum(DomainAggregate.bytes), 0)
+            )
+            .filter(
+                DomainAggregate.scan_id == scan_id,
+                DomainAggregate.is_third_party == False
+            )
+            .one()
+        )
+    
+    # Get third-party domain aggregates
+    third_party_aggregates = (
         db.query(DomainAggregate)
-        .filter(DomainAggregate.scan_id == scan_id)
+        .filter(
+            DomainAggregate.scan_id == scan_id,
+            DomainAggregate.is_third_party == True
+        )
         .all()
     )
     
-    # Get cookies grouped by domain
-    cookies = (
-        db.query(Cookie)
+    # Count cookies per cookie domain, then fold into base domains
+    cookie_counts = (
+        db.query(Domain.name, func.count())
+        .join(Cookie, Cookie.domain_id == Domain.id)
         .filter(Cookie.scan_id == scan_id)
+        .group_by(Domain.name)
         .all()
     )
     
-    # Count cookies per domain
     cookies_by_domain = {}
-    for cookie in cookies:
-        extracted = tldextract.extract(cookie.domain)
-        domain_key = f"{extracted.domain}.{extracted.suffix}"
-        cookies_by_domain[domain_key] = cookies_by_domain.get(domain_key, 0) + 1
-    
-    # Load tracker list (for coloring nodes)
-    tracker_domains = set()
-    try:
-        import json
-        with open('/app/tracker_lists/default.json', 'r') as f:
-            tracker_domains = set(json.load(f))
-    except Exception:
-        pass
+    for cookie_domain, count in cookie_counts:
+        domain_key = base_domain_of(cookie_domain)
+        cookies_by_domain[domain_key] = cookies_by_domain.get(domain_key, 0) + count
     
     nodes = []
     edges = []
@@ -210,40 +444,39 @@ async def get_scan_graph(request: Request, scan_id: uuid.UUID, db: Session = Dep
         id=scan.base_domain,
         domain=scan.base_domain,
         is_third_party=False,
-        request_count=sum(d.request_count for d in domain_aggregates if not d.is_third_party),
-        bytes=sum(d.bytes for d in domain_aggregates if not d.is_third_party),
+        request_count=first_party_requests,
+        bytes=first_party_bytes,
         cookies_count=cookies_by_domain.get(scan.base_domain, 0),
         is_tracker=False
     )
     nodes.append(root_node)
     
     # Add third-party nodes
-    for domain_agg in domain_aggregates:
-        if domain_agg.is_third_party:
-            node = GraphNode(
-                id=domain_agg.domain,
-                domain=domain_agg.domain,
-                is_third_party=True,
-                request_count=domain_agg.request_count,
-                bytes=domain_agg.bytes,
-                cookies_count=cookies_by_domain.get(domain_agg.domain, 0),
-                is_tracker=domain_agg.domain in tracker_domains
-            )
-            nodes.append(node)
-            
-            # Create edge from root to third party
-            edge = GraphEdge(
-                source=scan.base_domain,
-                target=domain_agg.domain
-            )
-            edges.append(edge)
+    for domain_agg in third_party_aggregates:
+        node = GraphNode(
+            id=domain_agg.domain,
+            domain=domain_agg.domain,
+            is_third_party=True,
+            request_count=domain_agg.request_count,
+            bytes=domain_agg.bytes,
+            cookies_count=cookies_by_domain.get(domain_agg.domain, 0),
+            is_tracker=is_tracker_domain(domain_agg.domain)
+        )
+        nodes.append(node)
+        
+        # Create edge from root to third party
+        edge = GraphEdge(
+            source=scan.base_domain,
+            target=domain_agg.domain
+        )
+        edges.append(edge)
     
-    return GraphResponse(nodes=nodes, edges=edges)
+    return cache_response(cache_key, GraphResponse(nodes=nodes, edges=edges))
 
 
 @app.post("/api/compare", response_model=CompareDelta)
 @limiter.limit("20/minute")
-async def compare_scans(request: Request, compare_request: CompareRequest, db: Session = Depends(get_db)):
+def compare_scans(request: Request, compare_request: CompareRequest, db: Session = Depends(get_db)):
     # Rate limit: 20 requests per minute per IP
     scan_a = db.query(Scan).filter(Scan.id == compare_request.scan_a_id).first()
     scan_b = db.query(Scan).filter(Scan.id == compare_request.scan_b_id).first()
@@ -251,30 +484,38 @@ async def compare_scans(request: Request, compare_request: CompareRequest, db: S
     if not scan_a or not scan_b:
         raise HTTPException(status_code=404, detail="One or both scans not found")
     
-    # Get domains for each scan
-    domains_a = set(
-        d.domain for d in 
-        db.query(DomainAggregate).filter(
-            DomainAggregate.scan_id == compare_request.scan_a_id,
+    # Domain set differences are computed by the database (EXCEPT) on the
+    # interned domain ids; only the differing ids are resolved to names
+    def third_party_domains(scan_id):
+        return select(DomainAggregate.domain_id).where(
+            DomainAggregate.scan_id == scan_id,
             DomainAggregate.is_third_party == True
-        ).all()
-    )
+        )
     
-    domains_b = set(
-        d.domain for d in 
-        db.query(DomainAggregate).filter(
-            DomainAggregate.scan_id == compare_request.scan_b_id,
-            DomainAggregate.is_third_party == True
-        ).all()
+    def domain_names(domain_ids):
+        return db.execute(
+            select(Domain.name).where(Domain.id.in_(domain_ids.scalar_subquery()))
+        ).scalars().all()
+    
+    domains_added = domain_names(
+        third_party_domains(compare_request.scan_b_id)
+        .except_(third_party_domains(compare_request.scan_a_id))
     )
     
-    # Get cookie counts
-    cookies_a = db.query(Cookie).filter(Cookie.scan_id == compare_request.scan_a_id).count()
-    cookies_b = db.query(Cookie).filter(Cookie.scan_id == compare_request.scan_b_id).count()
+    domains_removed = domain_names(
+        third_party_domains(compare_request.scan_a_id)
+        .except_(third_party_domains(compare_request.scan_b_id))
+    )
     
-    # Calculate deltas
-    domains_added = list(domains_b - domains_a)
-    domains_removed = list(domains_a - domains_b)
+    # Get cookie counts for both scans in one grouped query
+    cookie_counts = dict(
+        db.query(Cookie.scan_id, func.count())
+        .filter(Cookie.scan_id.in_([compare_request.scan_a_id, compare_request.scan_b_id]))
+        .group_by(Cookie.scan_id)
+        .all()
+    )
+    cookies_a = cookie_counts.get(compare_request.scan_a_id, 0)
+    cookies_b = cookie_counts.get(compare_request.scan_b_id, 0)
     
     return CompareDelta(
         third_party_domains_delta=scan_b.third_party_domains - scan_a.third_party_domains,
@@ -288,18 +529,21 @@ async def compare_scans(request: Request, compare_request: CompareRequest, db: S
     )
 
 
+# Summary columns serialized by ScanListItem; skips wide text fields like page_title
+LIST_COLUMNS = tuple(getattr(Scan, field) for field in ScanListItem.model_fields)
+
+
 @app.get("/api/scans", response_model=List[ScanListItem])
 @limiter.limit("30/minute")
-async def list_scans(request: Request, limit: int = 20, db: Session = Depends(get_db)):
+def list_scans(request: Request, limit: int = 20, db: Session = Depends(get_db)):
     # Rate limit: 30 requests per minute per IP
-    scans = (
-        db.query(Scan)
+    rows = db.execute(
+        select(*LIST_COLUMNS)
         .order_by(Scan.created_at.desc())
         .limit(limit)
-        .all()
-    )
+    ).mappings().all()
     
-    return [ScanListItem.model_validate(s) for s in scans]
+    return rows
 
 
 if __name__ == "__main__":
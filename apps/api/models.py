@@ -1,28 +1,114 @@
 # SQLAlchemy database models for privacy scan data.
 import uuid
-from datetime import datetime
 from sqlalchemy import (
-    Column, String, Integer, BigInteger, Boolean, 
-    Text, DateTime, ForeignKey, JSON
+    Column, String, Integer, BigInteger, Boolean, Computed, 
+    Text, DateTime, ForeignKey, JSON, Index, UniqueConstraint, event, func, text
 )
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, declared_attr, relationship
 from database import Base
 
+# Fixed resource kinds stored as one count column each on domain_aggregates
+RESOURCE_KINDS = ('script', 'image', 'xhr', 'font', 'css', 'media', 'other')
+# Playwright resource types counted under a differently named kind
+RESOURCE_KIND_ALIASES = {'stylesheet': 'css', 'fetch': 'xhr'}
+
+
+def _capped_penalty(column, points, cap):
+    # min(cap, column * points) written so both Postgres and SQLite accept it
+    return f"CASE WHEN {column} * {points} > {cap} THEN {cap} ELSE {column} * {points} END"
+
+
+# Privacy score (0-100) for completed scans, derived from the stored summary
+# metrics; queued/running/failed scans score 0
+PRIVACY_PENALTY_SQL = " + ".join([
+    _capped_penalty("third_party_domains", 3, 30),
+    _capped_penalty("cookies_set", 2, 25),
+    _capped_penalty("localstorage_keys", 3, 15),
+    "CASE WHEN indexeddb_present THEN 10 ELSE 0 END",
+    _capped_penalty("tracker_domains", 10, 20),
+    _capped_penalty("fingerprinting_count", 8, 25),
+])
+PRIVACY_SCORE_SQL = (
+    f"CASE WHEN status = 'completed' AND {PRIVACY_PENALTY_SQL} < 100 "
+    f"THEN 100 - ({PRIVACY_PENALTY_SQL}) ELSE 0 END"
+)
+
+# IDs are generated by Postgres (gen_random_uuid) for raw/bulk inserts such as
+# the worker's; the Python default still covers ORM inserts and SQLite tests
+
+
+class Domain(Base):
+    # Interned domain names shared by every scan's cookies and domain aggregates
+    __tablename__ = "domains"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(Text, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('name', name='uq_domains_name'),
+    )
+
+
+class InternedDomainMixin:
+    # Stores the domain as a `domains.id`; `domain` reads/writes the name and
+    # new names are resolved to `domains` rows at flush (intern_pending_domains)
+    @declared_attr
+    def domain_id(cls):
+        return Column(Integer, ForeignKey("domains.id"), nullable=False)
+    
+    @declared_attr
+    def domain_ref(cls):
+        return relationship("Domain", lazy="joined", innerjoin=True)
+    
+    @property
+    def domain(self):
+        if self.domain_ref is not None:
+            return self.domain_ref.name
+        return getattr(self, "_pending_domain", None)
+    
+    @domain.setter
+    def domain(self, name):
+        self._pending_domain = name
+        self.domain_ref = None
+
+
+@event.listens_for(Session, "before_flush")
+def intern_pending_domains(session, flush_context, instances):
+    pending = [
+        obj for obj in session.new
+        if isinstance(obj, InternedDomainMixin) and obj.domain_ref is None
+    ]
+    if not pending:
+        return
+    
+    names = {obj._pending_domain for obj in pending}
+    known = {obj.name: obj for obj in session.new if isinstance(obj, Domain)}
+    with session.no_autoflush:
+        for domain in session.query(Domain).filter(Domain.name.in_(names)):
+            known.setdefault(domain.name, domain)
+    
+    for obj in pending:
+        if obj._pending_domain not in known:
+            known[obj._pending_domain] = Domain(name=obj._pending_domain)
+        obj.domain_ref = known[obj._pending_domain]
+
 
 class Scan(Base):
     __tablename__ = "scans"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
     url = Column(Text, nullable=False)
     final_url = Column(Text, nullable=True)
     base_domain = Column(Text, nullable=False)
     profile = Column(String(20), nullable=False)  # 'baseline' or 'strict'
     status = Column(String(20), nullable=False, default='queued')  # queued|running|completed|failed
     
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
-    started_at = Column(DateTime, nullable=True)
-    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    # Worker runs started for this scan; runs lost with their worker are retried
+    attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
     
     http_status = Column(Integer, nullable=True)
     page_title = Column(Text, nullable=True)
@@ -34,7 +120,14 @@ class Scan(Base):
     cookies_set = Column(Integer, default=0)
     localstorage_keys = Column(Integer, default=0)
     indexeddb_present = Column(Boolean, default=False)
-    privacy_score = Column(Integer, default=0)
+    tracker_domains = Column(Integer, default=0)
+    fingerprinting_count = Column(Integer, default=0)
+    privacy_score = Column(Integer, Computed(PRIVACY_SCORE_SQL, persisted=True))
+    
+    # Graph summary precomputed by the worker when the scan completes
+    first_party_request_count = Column(Integer, nullable=True)
+    first_party_bytes = Column(BigInteger, nullable=True)
+    graph_cache = Column(JSON, nullable=True)  # {"nodes": [...], "edges": [...]}
     
     error_message = Column(Text, nullable=True)
     
@@ -44,37 +137,81 @@ class Scan(Base):
     storage_summary = relationship("StorageSummary", back_populates="scan", uselist=False, cascade="all, delete-orphan")
     artifacts = relationship("Artifact", back_populates="scan", cascade="all, delete-orphan")
     fingerprinting_detections = relationship("FingerprintingDetection", back_populates="scan", cascade="all, delete-orphan")
+    
+    # Status filters with newest-first ordering (also serves plain status lookups)
+    __table_args__ = (
+        Index('ix_scans_status_created', 'status', text('created_at DESC')),
+    )
+    
+    # Fetch created_at and privacy_score via INSERT ... RETURNING so new scans
+    # can be serialized without a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
 
-class DomainAggregate(Base):
+class DomainAggregate(InternedDomainMixin, Base):
     __tablename__ = "domain_aggregates"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
+    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False, index=True)
     
-    domain = Column(Text, nullable=False)
     is_third_party = Column(Boolean, nullable=False)
     request_count = Column(Integer, nullable=False)
     bytes = Column(BigInteger, nullable=False)
-    resource_breakdown = Column(JSON, nullable=False)  # {"script": 5, "image": 2, ...}
+    
+    # Request counts per resource kind (see RESOURCE_KINDS)
+    script_count = Column(Integer, nullable=False, default=0)
+    image_count = Column(Integer, nullable=False, default=0)
+    xhr_count = Column(Integer, nullable=False, default=0)
+    font_count = Column(Integer, nullable=False, default=0)
+    css_count = Column(Integer, nullable=False, default=0)
+    media_count = Column(Integer, nullable=False, default=0)
+    other_count = Column(Integer, nullable=False, default=0)
     
     scan = relationship("Scan", back_populates="domain_aggregates")
+    
+    @property
+    def resource_breakdown(self):
+        # API shape: {"script": 5, "image": 2, ...}, omitting kinds with no requests
+        counts = {kind: getattr(self, f"{kind}_count") or 0 for kind in RESOURCE_KINDS}
+        return {kind: count for kind, count in counts.items() if count}
+    
+    @resource_breakdown.setter
+    def resource_breakdown(self, breakdown):
+        # Kinds outside RESOURCE_KINDS (after aliasing) are counted as "other"
+        counts = dict.fromkeys(RESOURCE_KINDS, 0)
+        for kind, count in breakdown.items():
+            kind = RESOURCE_KIND_ALIASES.get(kind, kind)
+            counts[kind if kind in counts else 'other'] += count
+        for kind, count in counts.items():
+            setattr(self, f"{kind}_count", count)
+    
+    # Report (top domains by bytes) and graph/compare (first- vs third-party) lookups
+    __table_args__ = (
+        Index('ix_domain_aggregates_scan_bytes', 'scan_id', text('bytes DESC')),
+        Index('ix_domain_aggregates_scan_tp', 'scan_id', 'is_third_party'),
+    )
 
 
-class Cookie(Base):
+class Cookie(InternedDomainMixin, Base):
     __tablename__ = "cookies"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
+    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False, index=True)
     
     name = Column(Text, nullable=False)
-    domain = Column(Text, nullable=False)
     path = Column(Text, nullable=False)
     expires_at = Column(DateTime, nullable=True)
     is_session = Column(Boolean, nullable=False)
     is_third_party = Column(Boolean, nullable=False)
     
     scan = relationship("Scan", back_populates="cookies")
+    
+    # Graph: cookie counts grouped by domain. A cookie is identified by
+    # name/domain/path within a scan, which lets the worker upsert them
+    __table_args__ = (
+        Index('ix_cookies_scan_domain', 'scan_id', 'domain_id'),
+        UniqueConstraint('scan_id', 'name', 'domain_id', 'path', name='uq_cookie_scope'),
+    )
 
 
 class StorageSummary(Base):
@@ -92,12 +229,12 @@ class StorageSummary(Base):
 class Artifact(Base):
     __tablename__ = "artifacts"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
+    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False, index=True)
     
     kind = Column(String(50), nullable=False)  # 'network_log'|'storage_dump'|'screenshot'
     uri = Column(Text, nullable=False)
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     scan = relationship("Scan", back_populates="artifacts")
 
@@ -105,14 +242,14 @@ class Artifact(Base):
 class FingerprintingDetection(Base):
     __tablename__ = "fingerprinting_detections"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, server_default=text("gen_random_uuid()"))
+    scan_id = Column(UUID(as_uuid=True), ForeignKey("scans.id"), nullable=False, index=True)
     
     technique = Column(String(50), nullable=False)  # 'canvas'|'webgl'|'audio'|'font'|'device'
     domain = Column(Text, nullable=False)
     script_url = Column(Text, nullable=True)
     evidence = Column(JSON, nullable=True)  # Specific patterns found
     severity = Column(String(20), nullable=False)  # 'low'|'medium'|'high'
-    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     scan = relationship("Scan", back_populates="fingerprinting_detections")
@@ -1,8 +1,23 @@
 # Pydantic schemas for API request and response validation.
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from ipaddress import ip_address
+from typing import Optional, List, Dict, Any, Literal
 from uuid import UUID
-from pydantic import BaseModel, HttpUrl, field_validator
+from pydantic import AnyHttpUrl, BaseModel, ConfigDict, TypeAdapter, ValidationError, field_validator
+
+# Basic SSRF protection - hostnames that always resolve to the scanner itself
+# (Chromium also resolves every *.localhost name to loopback)
+BLOCKED_HOSTS = frozenset({'localhost'})
+
+# Scheme/host/port parsing runs in pydantic-core; the submitted string is
+# still what gets stored, so URLs aren't rewritten (e.g. trailing slash)
+HTTP_URL_ADAPTER = TypeAdapter(AnyHttpUrl)
+
+Profile = Literal['baseline', 'strict']
+ScanState = Literal['queued', 'running', 'completed', 'failed']
+
+# Response models are read-only views of database rows
+RESPONSE_CONFIG = ConfigDict(from_attributes=True, frozen=True)
 
 
 class StrictConfig(BaseModel):
@@ -12,36 +27,38 @@ class StrictConfig(BaseModel):
 
 class ScanCreateRequest(BaseModel):
     url: str
-    profiles: List[str] = ["baseline", "strict"]
+    profiles: List[Profile] = ["baseline", "strict"]
     strict_config: StrictConfig = StrictConfig()
     
     @field_validator('url')
     @classmethod
     def validate_url(cls, v: str) -> str:
-        if not v.startswith(('http://', 'https://')):
-            raise ValueError('URL must start with http:// or https://')
+        try:
+            url = HTTP_URL_ADAPTER.validate_python(v)
+        except ValidationError:
+            raise ValueError('URL must be a valid http:// or https:// URL')
         
-        # Basic SSRF protection - block obvious localhost/private ranges
-        lower_url = v.lower()
-        blocked = ['localhost', '127.0.0.1', '0.0.0.0', '169.254', '10.', '172.16.', '192.168.']
-        for blocked_pattern in blocked:
-            if blocked_pattern in lower_url:
-                raise ValueError(f'URL contains blocked pattern: {blocked_pattern}')
+        # Only the host is checked, so paths like /10.jpg are not false positives;
+        # a trailing dot names the same host (localhost. is localhost)
+        host = url.host.strip('[]').rstrip('.').lower()
+        if host in BLOCKED_HOSTS or host.endswith(tuple('.' + h for h in BLOCKED_HOSTS)):
+            raise ValueError(f'URL host is not allowed: {host}')
+        
+        # Literal IPs must be globally routable (blocks loopback, private,
+        # link-local/metadata, shared 100.64/10 and reserved ranges) and unicast
+        try:
+            ip = ip_address(host)
+        except ValueError:
+            return v
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'URL host is not allowed: {host}')
         
-        return v
-    
-    @field_validator('profiles')
-    @classmethod
-    def validate_profiles(cls, v: List[str]) -> List[str]:
-        valid_profiles = {'baseline', 'strict'}
-        for profile in v:
-            if profile not in valid_profiles:
-                raise ValueError(f'Invalid profile: {profile}. Must be one of {valid_profiles}')
         return v
 
 
 class ScanCreateResponse(BaseModel):
     scan_ids: List[UUID]
+    scans: List["ScanListItem"]
 
 
 class ScanStatus(BaseModel):
@@ -49,8 +66,8 @@ class ScanStatus(BaseModel):
     url: str
     final_url: Optional[str]
     base_domain: str
-    profile: str
-    status: str
+    profile: Profile
+    status: ScanState
     
     created_at: datetime
     started_at: Optional[datetime]
@@ -69,8 +86,7 @@ class ScanStatus(BaseModel):
     
     error_message: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 
 class DomainAggregateResponse(BaseModel):
@@ -80,8 +96,7 @@ class DomainAggregateResponse(BaseModel):
     bytes: int
     resource_breakdown: Dict[str, int]
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 
 class CookieResponse(BaseModel):
@@ -92,8 +107,7 @@ class CookieResponse(BaseModel):
     is_session: bool
     is_third_party: bool
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 
 class StorageSummaryResponse(BaseModel):
@@ -101,8 +115,7 @@ class StorageSummaryResponse(BaseModel):
     indexeddb_present: bool
     serviceworker_present: bool
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 
 class ArtifactResponse(BaseModel):
@@ -110,8 +123,7 @@ class ArtifactResponse(BaseModel):
     uri: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 class FingerprintingDetectionResponse(BaseModel):
     id: UUID
@@ -122,8 +134,7 @@ class FingerprintingDetectionResponse(BaseModel):
     severity: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
 
 class ScanReport(BaseModel):
     scan: ScanStatus
@@ -176,10 +187,15 @@ class ScanListItem(BaseModel):
     id: UUID
     url: str
     base_domain: str
-    profile: str
-    status: str
+    profile: Profile
+    status: ScanState
     created_at: datetime
     privacy_score: int
     
-    class Config:
-        from_attributes = True
+    model_config = RESPONSE_CONFIG
+
+
+ScanCreateResponse.model_rebuild()
+
+# Parses and validates the create-scan body in one pydantic-core pass
+SCAN_CREATE_ADAPTER = TypeAdapter(ScanCreateRequest)
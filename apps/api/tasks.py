@@ -1,7 +1,18 @@
 # Celery task definitions for background job processing.
+import orjson
 from celery import Celery
+from kombu.serialization import register
 from config import settings
 
+# orjson-backed serializer for task messages (the worker registers the same one)
+register(
+    'orjson',
+    orjson.dumps,
+    orjson.loads,
+    content_type='application/x-orjson',
+    content_encoding='utf-8'
+)
+
 # Create Celery app
 celery_app = Celery(
     "privacy_scanner",
@@ -10,15 +21,35 @@ celery_app = Celery(
 )
 
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    task_serializer='orjson',
+    accept_content=['orjson', 'json'],
+    result_serializer='orjson',
     timezone='UTC',
     enable_utc=True,
+    # Scan progress lives in the database; nothing reads task results
+    task_ignore_result=True,
+    result_expires=60,
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
 )
 
 
-@celery_app.task(name="run_scan")
-def run_scan(scan_id: str, strict_config: dict):
+def enqueue_scans(jobs):
+    # Publish (scan_id, block_third_party, allowlist_domains) jobs over one
+    # pooled broker connection.
+    # Scan progress is read from the database, never from the result backend,
+    # so skip the per-task result subscription round-trip.
+    with celery_app.producer_pool.acquire(block=True) as producer:
+        for scan_id, block_third_party, allowlist_domains in jobs:
+            celery_app.send_task(
+                "run_scan",
+                args=[scan_id, block_third_party, allowlist_domains],
+                producer=producer,
+                ignore_result=True
+            )
+
+
+@celery_app.task(name="run_scan", ignore_result=True)
+def run_scan(scan_id: str, block_third_party: bool = False, allowlist_domains: list = ()):
     # This is just a stub - the real implementation is in apps/worker
     pass
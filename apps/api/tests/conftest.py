@@ -1,46 +1,226 @@
 import pytest
+import pytest_asyncio
 import os
-from sqlalchemy import create_engine
+import threading
+import uuid
+import httpx
+import tldextract
+from sqlalchemy import create_engine, event, insert, select, union
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 # Set testing environment variable before importing main
 os.environ["TESTING"] = "true"
 
+import main
 from database import Base, get_db
 from main import app
+from models import (
+    Scan, Domain, DomainAggregate, Cookie, StorageSummary, Artifact, FingerprintingDetection
+)
 
-# Test database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# In-memory test database: StaticPool keeps the one connection (and so the
+# database) alive for the whole session. Each pytest-xdist worker is its own
+# process and therefore gets its own database.
+SQLALCHEMY_DATABASE_URL = "sqlite+pysqlite:///:memory:"
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+# Let SQLAlchemy (not pysqlite) issue BEGIN so per-test SAVEPOINTs work
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
 
 
-@pytest.fixture(scope="function")
-def db_session():
-    """Create a fresh database for each test."""
+@pytest.fixture(scope="session", autouse=True)
+def database_schema():
+    """Create the schema once for the whole test session."""
     Base.metadata.create_all(bind=engine)
-    session = TestingSessionLocal()
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def public_suffix_list(request, tmp_path_factory):
+    """Load the public suffix list offline, cached in .pytest_cache across runs."""
+    # Fall back to a per-session directory when run with -p no:cacheprovider
+    cache = getattr(request.config, "cache", None)
+    cache_dir = cache.mkdir("tldextract") if cache else tmp_path_factory.mktemp("tldextract")
+    extractor = tldextract.TLDExtract(cache_dir=str(cache_dir), suffix_list_urls=())
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(main, "_tld_extract", extractor)
+        main.base_domain_of.cache_clear()
+        yield extractor
+    main.base_domain_of.cache_clear()
+
+
+@pytest.fixture(scope="function", autouse=True)
+def db_session(database_schema):
+    """Give each test its own session and route the app's get_db to it.
+    
+    The test runs inside an outer transaction that is rolled back afterwards
+    (commits only release a SAVEPOINT), so module-scoped rows survive.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    # Requests may overlap (async_client + asyncio.gather); the session and its
+    # single connection are handed to one request at a time
+    session_lock = threading.Lock()
+    
+    def override_get_db():
+        with session_lock:
+            yield session
+    
+    app.dependency_overrides[get_db] = override_get_db
     try:
         yield session
     finally:
+        app.dependency_overrides.pop(get_db, None)
         session.close()
-        Base.metadata.drop_all(bind=engine)
+        transaction.rollback()
+        connection.close()
 
 
-@pytest.fixture(scope="function")
-def client(db_session):
-    """Create a test client with overridden database dependency."""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def async_client():
+    """Share one in-process async client across the session's concurrent-request tests."""
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=5.0
+    ) as test_client:
+        yield test_client
+
+
+@pytest.fixture(autouse=True)
+def no_scan_enqueue(monkeypatch):
+    """Keep POST /api/scans from publishing run_scan tasks to the broker."""
+    monkeypatch.setattr(main, "enqueue_scans", lambda jobs: None)
+
+
+@pytest.fixture(scope="module")
+def sample_scan_id(database_schema):
+    """Create one queued scan shared by a module's read-only endpoint tests."""
+    scan = Scan(
+        id=uuid.uuid4(), url="https://example.com", base_domain="example.com",
+        profile="baseline", status="queued"
+    )
+    with TestingSessionLocal() as session:
+        session.add(scan)
+        session.commit()
     
-    app.dependency_overrides[get_db] = override_get_db
+    yield str(scan.id)
+    
+    with TestingSessionLocal() as session:
+        session.query(Scan).filter(Scan.id == scan.id).delete()
+        session.commit()
+
+
+@pytest.fixture
+def seed_scan(db_session):
+    """Return a helper that inserts a scan with its domain aggregates and cookies.
+    
+    Rows go in as Core/bulk INSERTs without an ORM flush, so domain names are
+    interned here rather than by the flush hook.
+    """
+    def intern_domain_ids(names):
+        lookup = select(Domain.name, Domain.id).where(Domain.name.in_(names))
+        ids = dict(db_session.execute(lookup).all())
+        missing = set(names) - ids.keys()
+        if missing:
+            db_session.execute(insert(Domain), [{"name": name} for name in missing])
+            ids = dict(db_session.execute(lookup).all())
+        return ids
+    
+    def seed(domains=(), cookies=(), **scan_fields):
+        scan_id = uuid.uuid4()
+        db_session.execute(Scan.__table__.insert().values(**{
+            "id": scan_id, "url": "https://example.com", "base_domain": "example.com",
+            "profile": "baseline", "status": "completed", **scan_fields
+        }))
+        
+        domain_ids = intern_domain_ids({row["domain"] for row in (*domains, *cookies)})
+        for model, rows in ((DomainAggregate, domains), (Cookie, cookies)):
+            if rows:
+                db_session.execute(insert(model), [
+                    {
+                        **{key: value for key, value in row.items() if key != "domain"},
+                        "scan_id": scan_id, "domain_id": domain_ids[row["domain"]]
+                    }
+                    for row in rows
+                ])
+        db_session.commit()
+        return scan_id
+    
+    return seed
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Create one test client; app startup runs once per test session."""
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="module")
+def completed_scan_id(database_schema):
+    """Insert a finished scan with every related row, as the worker leaves it."""
+    scan_id = uuid.uuid4()
+    with TestingSessionLocal() as session:
+        session.add(Scan(
+            id=scan_id, url="https://example.com", base_domain="example.com",
+            profile="baseline", status="completed", http_status=200,
+            total_requests=15, total_bytes=60000, third_party_domains=1,
+            cookies_set=2, localstorage_keys=3, indexeddb_present=True
+        ))
+        session.flush()
+        session.add_all([
+            DomainAggregate(
+                scan_id=scan_id, domain="example.com", is_third_party=False,
+                request_count=10, bytes=50000, resource_breakdown={"script": 6, "image": 4}
+            ),
+            DomainAggregate(
+                scan_id=scan_id, domain="doubleclick.net", is_third_party=True,
+                request_count=5, bytes=10000, resource_breakdown={"script": 3, "xhr": 2}
+            ),
+            Cookie(
+                scan_id=scan_id, name="session", domain=".example.com", path="/",
+                is_session=True, is_third_party=False
+            ),
+            Cookie(
+                scan_id=scan_id, name="IDE", domain=".doubleclick.net", path="/",
+                is_session=False, is_third_party=True
+            ),
+            StorageSummary(
+                scan_id=scan_id, localstorage_keys_count=3,
+                indexeddb_present=True, serviceworker_present=False
+            ),
+            Artifact(scan_id=scan_id, kind="screenshot", uri=f"http://localhost:9000/artifacts/{scan_id}/screenshot.png"),
+            FingerprintingDetection(
+                scan_id=scan_id, technique="canvas", domain="doubleclick.net",
+                script_url="https://doubleclick.net/fp.js", severity="high",
+                evidence={"patterns_found": ["toDataURL"]}
+            ),
+        ])
+        session.commit()
+    
+    yield str(scan_id)
+    
+    with TestingSessionLocal() as session:
+        for model in (DomainAggregate, Cookie, StorageSummary, Artifact, FingerprintingDetection):
+            session.query(model).filter(model.scan_id == scan_id).delete()
+        session.query(Scan).filter(Scan.id == scan_id).delete()
+        # Drop the interned domain names nothing references any more
+        referenced = union(select(Cookie.domain_id), select(DomainAggregate.domain_id))
+        session.query(Domain).filter(Domain.id.not_in(referenced)).delete(synchronize_session=False)
+        session.commit()
@@ -0,0 +1,29 @@
+import pytest
+import uuid
+
+import cache
+from cache import get_cached, set_cached
+from shared.scan_cache import scan_cache_key
+
+
+def test_scan_cache_key_format():
+    """Test cache keys are namespaced per scan and view."""
+    scan_id = uuid.UUID("00000000-0000-0000-0000-000000000000")
+    assert scan_cache_key(scan_id, "report") == "scan:00000000-0000-0000-0000-000000000000:report"
+
+
+def test_cache_disabled_during_testing():
+    """Test the cache is a no-op while TESTING is set."""
+    key = scan_cache_key(uuid.uuid4(), "status")
+    set_cached(key, '{"status": "queued"}')
+    assert get_cached(key) is None
+
+
+def test_cache_round_trip(monkeypatch):
+    """Test cached bodies are returned from Redis."""
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    scan_id = uuid.uuid4()
+    key = scan_cache_key(scan_id, "status")
+    
+    set_cached(key, '{"status": "queued"}')
+    assert get_cached(key) == b'{"status": "queued"}'
@@ -1,5 +1,11 @@
+import uuid
+
 import pytest
-from database import get_db, SessionLocal
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database import Base, get_db, SessionLocal, engine
+from models import Scan, Cookie, Domain, DomainAggregate
 
 
 def test_get_db_yields_session():
@@ -39,3 +45,114 @@ def test_session_local_creates_sessions():
     session = SessionLocal()
     assert session is not None
     session.close()
+
+
+def test_engine_pool_uses_configured_size():
+    """Test that the engine pool is sized from settings."""
+    assert engine.pool.size() == settings.db_pool_size
+    assert engine.pool._max_overflow == settings.db_max_overflow
+    assert engine.pool._pool.use_lifo is True
+
+
+def test_engine_compiled_cache_size():
+    """Test that the engine keeps a larger compiled statement cache."""
+    assert engine._compiled_cache.capacity == 1024
+
+
+def test_engine_batches_multi_row_inserts():
+    """Test executemany inserts are sent as large multi-VALUES pages."""
+    assert engine.dialect.insertmanyvalues_page_size == 1000
+
+
+def test_session_keeps_objects_after_commit():
+    """Test that sessions don't expire loaded objects on commit."""
+    assert SessionLocal.kw["expire_on_commit"] is False
+
+
+def test_domains_are_interned_across_scans(db_session):
+    """Test cookies and aggregates from different scans share one domain row."""
+    scan_ids = [uuid.uuid4(), uuid.uuid4()]
+    for scan_id in scan_ids:
+        db_session.add(Scan(
+            id=scan_id, url="https://example.com", base_domain="example.com",
+            profile="baseline", status="completed"
+        ))
+        db_session.add(DomainAggregate(
+            scan_id=scan_id, domain="shared.com", is_third_party=True,
+            request_count=1, bytes=10
+        ))
+        db_session.add(Cookie(
+            scan_id=scan_id, name="id", domain="shared.com", path="/",
+            is_session=True, is_third_party=True
+        ))
+    db_session.commit()
+    
+    assert db_session.query(Domain).filter(Domain.name == "shared.com").count() == 1
+    cookies = db_session.query(Cookie).filter(Cookie.scan_id.in_(scan_ids)).all()
+    assert [cookie.domain for cookie in cookies] == ["shared.com", "shared.com"]
+
+
+def test_cookie_scope_is_unique_per_scan(db_session):
+    """Test a scan cannot store the same cookie name/domain/path twice."""
+    scan_id = uuid.uuid4()
+    db_session.add(Scan(
+        id=scan_id, url="https://example.com", base_domain="example.com",
+        profile="baseline", status="completed"
+    ))
+    for _ in range(2):
+        db_session.add(Cookie(
+            scan_id=scan_id, name="sid", domain=".example.com", path="/",
+            is_session=True, is_third_party=False
+        ))
+    
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+
+
+def test_privacy_score_is_generated_from_scan_metrics(db_session):
+    """Test the database derives privacy_score from the stored summary metrics."""
+    metrics = dict(
+        third_party_domains=4, cookies_set=20, localstorage_keys=1,
+        indexeddb_present=True, tracker_domains=1, fingerprinting_count=0
+    )
+    completed = Scan(
+        id=uuid.uuid4(), url="https://example.com", base_domain="example.com",
+        profile="baseline", status="completed", **metrics
+    )
+    saturated = Scan(
+        id=uuid.uuid4(), url="https://example.com", base_domain="example.com",
+        profile="baseline", status="completed", **{**metrics, "fingerprinting_count": 5}
+    )
+    queued = Scan(
+        id=uuid.uuid4(), url="https://example.com", base_domain="example.com",
+        profile="baseline", status="queued"
+    )
+    db_session.add_all([completed, saturated, queued])
+    db_session.commit()
+    
+    # 100 - (12 third-party + 25 cookies + 3 storage + 10 IndexedDB + 10 trackers)
+    assert db_session.get(Scan, completed.id, populate_existing=True).privacy_score == 40
+    assert db_session.get(Scan, saturated.id, populate_existing=True).privacy_score == 15
+    assert db_session.get(Scan, queued.id, populate_existing=True).privacy_score == 0
+
+
+def test_models_declare_migration_indexes():
+    """Test model metadata declares the indexes created by migrations."""
+    index_names = {
+        index.name
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+    }
+    assert {
+        "ix_scans_created_at",
+        "ix_scans_status_created",
+        "ix_domain_aggregates_scan_id",
+        "ix_domain_aggregates_scan_bytes",
+        "ix_domain_aggregates_scan_tp",
+        "ix_cookies_scan_id",
+        "ix_cookies_scan_domain",
+        "ix_artifacts_scan_id",
+        "ix_fingerprinting_detections_scan_id",
+    } <= index_names
+
@@ -1,28 +1,80 @@
 import pytest
-from tasks import celery_app, run_scan
+from types import SimpleNamespace
+from kombu.serialization import dumps, loads
+from tasks import celery_app, enqueue_scans, run_scan
 
 
-def test_celery_app_configuration():
+@pytest.fixture(scope="module")
+def celery_ctx():
+    """Materialize the app's config and task registry once for the module."""
+    return SimpleNamespace(
+        app=celery_app, conf=celery_app.conf, run_scan=run_scan, tasks=dict(celery_app.tasks)
+    )
+
+
+def test_celery_app_configuration(celery_ctx):
     """Test Celery app is configured correctly."""
-    assert celery_app is not None
-    assert celery_app.conf.task_serializer == 'json'
-    assert celery_app.conf.accept_content == ['json']
-    assert celery_app.conf.result_serializer == 'json'
-    assert celery_app.conf.timezone == 'UTC'
-    assert celery_app.conf.enable_utc is True
+    assert celery_ctx.app is not None
+    assert celery_ctx.conf.task_serializer == 'orjson'
+    assert celery_ctx.conf.accept_content == ['orjson', 'json']
+    assert celery_ctx.conf.result_serializer == 'orjson'
+    assert celery_ctx.conf.timezone == 'UTC'
+    assert celery_ctx.conf.enable_utc is True
 
 
-def test_run_scan_task_exists():
+def test_run_scan_task_exists(celery_ctx):
     """Test run_scan task is registered."""
     # Task should be callable
-    assert callable(run_scan)
+    assert callable(celery_ctx.run_scan)
     
     # Test calling the stub (should not raise error)
-    result = run_scan("test-scan-id", {})
+    result = celery_ctx.run_scan("test-scan-id", {})
     assert result is None  # Stub returns None
 
 
-def test_celery_task_registered():
+def test_celery_task_registered(celery_ctx):
     """Test run_scan is registered as Celery task."""
     # Check task is registered with correct name
-    assert "run_scan" in celery_app.tasks
+    assert "run_scan" in celery_ctx.tasks
+
+
+def test_enqueue_scans_shares_one_producer(monkeypatch):
+    """Test enqueue_scans publishes every job through the same producer."""
+    sent = []
+    monkeypatch.setattr(
+        celery_app, "send_task",
+        lambda name, args, producer, ignore_result: sent.append((name, args, producer))
+    )
+    
+    enqueue_scans([("scan-a", False, []), ("scan-b", True, ["cdn.example"])])
+    
+    assert [(name, args) for name, args, _ in sent] == [
+        ("run_scan", ["scan-a", False, []]),
+        ("run_scan", ["scan-b", True, ["cdn.example"]]),
+    ]
+    assert sent[0][2] is sent[1][2]
+
+
+def test_enqueue_scans_skips_result_subscription(monkeypatch):
+    """Test enqueue_scans does not subscribe to task results."""
+    calls = []
+    monkeypatch.setattr(celery_app.backend, "on_task_call", lambda *args: calls.append(args))
+    monkeypatch.setattr(celery_app.amqp, "send_task_message", lambda *args, **kwargs: None)
+    
+    enqueue_scans([("scan-a", False, []), ("scan-b", False, [])])
+    
+    assert calls == []
+
+
+def test_run_scan_ignores_results():
+    """Test run_scan is fire-and-forget and writes nothing to the result backend."""
+    assert celery_app.conf.task_ignore_result is True
+    assert run_scan.ignore_result is True
+
+
+def test_orjson_serializer_round_trip():
+    """Test task args survive the registered orjson serializer."""
+    args = ["3f2a4c1e-0000-0000-0000-000000000000", True, ["cdn.example"]]
+    content_type, encoding, body = dumps(args, serializer="orjson")
+    assert content_type == "application/x-orjson"
+    assert loads(body, content_type, encoding, accept=[content_type]) == args
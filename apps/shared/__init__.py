@@ -0,0 +1 @@
+# Code shared by the API and the worker (both images copy this package).
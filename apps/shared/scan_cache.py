@@ -0,0 +1,9 @@
+# Redis keys of the API's cached scan responses: the API fills them and the
+# worker deletes them whenever a scan changes state.
+
+# Views cached per scan
+CACHED_SCAN_VIEWS = ("status", "report", "graph")
+
+
+def scan_cache_key(scan_id, view: str) -> str:
+    return f"scan:{scan_id}:{view}"
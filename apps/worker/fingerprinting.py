@@ -1,6 +1,17 @@
 # Fingerprinting detection patterns
 # These patterns identify browser fingerprinting techniques in JavaScript code
 
+import re
+from collections import OrderedDict
+
+import ahocorasick
+import xxhash
+
+try:
+    import hyperscan
+except ImportError:  # Wheels only exist for x86-64; fall back to Aho-Corasick
+    hyperscan = None
+
 FINGERPRINTING_PATTERNS = {
     'canvas': {
         'patterns': [
@@ -78,26 +89,149 @@ FINGERPRINTING_PATTERNS = {
 }
 
 
-def detect_fingerprinting(script_content: str, script_url: str) -> list:
-    detections = []
+# Flattened at import into parallel arrays: pattern i belongs to technique
+# PATTERN_TECHNIQUE_ID[i], whose (name, severity, description) is in
+# TECHNIQUE_META. Patterns keep declaration order, so sorted ids do too.
+TECHNIQUE_META = tuple(
+    (technique, config['severity'], config['description'])
+    for technique, config in FINGERPRINTING_PATTERNS.items()
+)
+ALL_PATTERNS = tuple(
+    pattern for config in FINGERPRINTING_PATTERNS.values() for pattern in config['patterns']
+)
+# UTF-8 forms handed to Hyperscan, which matches on the encoded script
+ALL_PATTERNS_BYTES = tuple(pattern.encode() for pattern in ALL_PATTERNS)
+PATTERN_TECHNIQUE_ID = tuple(
+    technique_id
+    for technique_id, config in enumerate(FINGERPRINTING_PATTERNS.values())
+    for _ in config['patterns']
+)
+
+# Scripts shorter than every pattern (empty bodies, stubs) can't match anything
+MIN_PATTERN_LENGTH = min(len(pattern) for pattern in ALL_PATTERNS)
+
+
+def build_automaton(patterns: tuple) -> ahocorasick.Automaton:
+    # One automaton over all patterns, so a script is scanned in a single pass
+    # instead of once per pattern
+    automaton = ahocorasick.Automaton()
+    for pattern_id, pattern in enumerate(patterns):
+        automaton.add_word(pattern, pattern_id)
+    automaton.make_automaton()
+    return automaton
+
+
+def build_database(patterns: tuple):
+    # Hyperscan compiles the literals into one SIMD-accelerated matcher;
+    # SINGLEMATCH reports each pattern once however often it occurs
+    database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    database.compile(
+        expressions=[re.escape(pattern) for pattern in patterns],
+        ids=list(range(len(patterns))),
+        flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(patterns)
+    )
+    return database
+
+
+# Built once at import and shared by every scan
+if hyperscan is not None:
+    PATTERN_DATABASE = build_database(ALL_PATTERNS_BYTES)
+else:
+    PATTERN_AUTOMATON = build_automaton(ALL_PATTERNS)
+
+
+def new_scratch():
+    # Hyperscan scratch space; reusable across scans but not shared by threads
+    return hyperscan.Scratch(PATTERN_DATABASE) if hyperscan is not None else None
+
+
+def find_pattern_ids(script_content: str, scratch=None, script_bytes: bytes = None) -> set:
+    # Indexes into ALL_PATTERNS of every pattern present in the script
+    # Both matchers stop early once every pattern has been seen, since the
+    # rest of the script can't change the result
+    found = set()
     
-    for technique, config in FINGERPRINTING_PATTERNS.items():
-        found_patterns = []
-        
-        for pattern in config['patterns']:
-            if pattern in script_content:
-                found_patterns.append(pattern)
-        
-        if found_patterns:
-            detections.append({
-                'technique': technique,
-                'severity': config['severity'],
-                'script_url': script_url,
-                'evidence': {
-                    'patterns_found': found_patterns[:5],  # Limit to first 5
-                    'total_matches': len(found_patterns),
-                    'description': config['description']
-                }
-            })
+    if hyperscan is None:
+        for _, pattern_id in PATTERN_AUTOMATON.iter(script_content):
+            found.add(pattern_id)
+            if len(found) == len(ALL_PATTERNS):
+                break
+        return found
     
-    return detections
+    def on_match(pattern_id, start, end, flags, context):
+        found.add(pattern_id)
+        # A truthy return halts the scan
+        return len(found) == len(ALL_PATTERNS)
+    
+    # Without a caller-owned scratch, allocate one so concurrent callers never
+    # share it; surrogatepass keeps lone surrogates from page scripts encodable
+    try:
+        PATTERN_DATABASE.scan(
+            script_bytes or script_content.encode('utf-8', 'surrogatepass'),
+            match_event_handler=on_match,
+            scratch=scratch or new_scratch()
+        )
+    except hyperscan.ScanTerminated:
+        pass
+    return found
+
+
+# Matched pattern ids by script content hash. Third-party scripts (analytics,
+# ad SDKs) are byte-identical across scans, so most are only scanned once per
+# worker process.
+PATTERN_CACHE_SIZE = 8192
+_pattern_cache = OrderedDict()
+
+
+def cached_pattern_ids(script_content: str, scratch=None) -> tuple:
+    # Sorted pattern ids for the script, from the LRU cache when seen before
+    script_bytes = script_content.encode('utf-8', 'surrogatepass')
+    key = xxhash.xxh3_128_digest(script_bytes)
+    
+    pattern_ids = _pattern_cache.get(key)
+    if pattern_ids is not None:
+        _pattern_cache.move_to_end(key)
+        return pattern_ids
+    
+    pattern_ids = tuple(sorted(find_pattern_ids(script_content, scratch, script_bytes)))
+    _pattern_cache[key] = pattern_ids
+    if len(_pattern_cache) > PATTERN_CACHE_SIZE:
+        _pattern_cache.popitem(last=False)
+    return pattern_ids
+
+
+def detect_fingerprinting(script_content: str, script_url: str, scratch=None) -> list:
+    if len(script_content) < MIN_PATTERN_LENGTH:
+        return []
+    
+    # Bucket matched patterns by technique in a single pass over the ids
+    found_by_technique = [[] for _ in TECHNIQUE_META]
+    for pattern_id in cached_pattern_ids(script_content, scratch):
+        found_by_technique[PATTERN_TECHNIQUE_ID[pattern_id]].append(ALL_PATTERNS[pattern_id])
+    
+    return [
+        {
+            'technique': technique,
+            'severity': severity,
+            'script_url': script_url,
+            'evidence': {
+                'patterns_found': found_patterns[:5],  # Limit to first 5
+                'total_matches': len(found_patterns),
+                'description': description
+            }
+        }
+        for (technique, severity, description), found_patterns
+        in zip(TECHNIQUE_META, found_by_technique)
+        if found_patterns
+    ]
+
+
+def detect_fingerprinting_batch(scripts, scratch=None) -> list:
+    # Detections for each (script_url, script_content) pair, in order; the
+    # whole batch shares one scratch allocation
+    if scratch is None:
+        scratch = new_scratch()
+    return [
+        detect_fingerprinting(script_content, script_url, scratch)
+        for script_url, script_content in scripts
+    ]
@@ -1,118 +1,222 @@
+import random
+from collections import OrderedDict
+
 import pytest
-from unittest.mock import Mock, patch
-from fingerprinting import detect_fingerprinting
 
+import fingerprinting
+from fingerprinting import (
+    ALL_PATTERNS,
+    FINGERPRINTING_PATTERNS,
+    build_automaton,
+    cached_pattern_ids,
+    detect_fingerprinting,
+    detect_fingerprinting_batch,
+    find_pattern_ids,
+)
+
+
+def reference_detections(script_content, script_url):
+    # The original one-substring-test-per-pattern detector, kept as the oracle
+    detections = []
+    for technique, config in FINGERPRINTING_PATTERNS.items():
+        found_patterns = [pattern for pattern in config['patterns'] if pattern in script_content]
+        if found_patterns:
+            detections.append({
+                'technique': technique,
+                'severity': config['severity'],
+                'script_url': script_url,
+                'evidence': {
+                    'patterns_found': found_patterns[:5],
+                    'total_matches': len(found_patterns),
+                    'description': config['description']
+                }
+            })
+    return detections
+
+
+def random_scripts(count, seed=1234):
+    # Mixes whole patterns, pattern fragments (near misses) and filler
+    rng = random.Random(seed)
+    filler = ['var a=1;', '\n', ' ', 'function(){}', '"2d"', 'canvas.', 'navigator.', 'é中', '(']
+    for _ in range(count):
+        pieces = []
+        for _ in range(rng.randint(0, 12)):
+            choice = rng.random()
+            if choice < 0.3:
+                pieces.append(rng.choice(ALL_PATTERNS))
+            elif choice < 0.6:
+                pattern = rng.choice(ALL_PATTERNS)
+                pieces.append(pattern[:rng.randint(1, len(pattern) - 1)])
+            else:
+                pieces.append(rng.choice(filler))
+        yield ''.join(pieces)
+
+
+@pytest.fixture(autouse=True)
+def empty_pattern_cache(monkeypatch):
+    monkeypatch.setattr(fingerprinting, '_pattern_cache', OrderedDict())
 
-def test_detect_fingerprinting_empty_requests():
-    """Test fingerprinting detection with no requests."""
-    result = detect_fingerprinting([])
-    assert result["detected"] is False
-    assert result["risk_level"] == "low"
-    assert result["confidence"] == 0.0
+
+@pytest.fixture
+def aho_corasick_only(monkeypatch):
+    # Force the fallback matcher used where Hyperscan wheels don't exist
+    monkeypatch.setattr(fingerprinting, 'hyperscan', None)
+    monkeypatch.setattr(fingerprinting, 'PATTERN_AUTOMATON', build_automaton(ALL_PATTERNS), raising=False)
+
+
+def test_detect_fingerprinting_empty_script():
+    """Test an empty or too-short script yields no detections."""
+    assert detect_fingerprinting('', 'https://example.com/empty.js') == []
+    assert detect_fingerprinting('var a;', 'https://example.com/stub.js') == []
 
 
 def test_detect_fingerprinting_canvas():
     """Test detection of canvas fingerprinting."""
-    requests = [
-        {
-            "method": "GET",
-            "url": "https://example.com/tracker.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    detections = detect_fingerprinting('var d = canvas.toDataURL();', 'https://example.com/tracker.js')
     
-    with patch('builtins.open', create=True) as mock_open:
-        mock_open.return_value.__enter__.return_value.read.return_value = (
-            "canvas.toDataURL"
-        )
-        result = detect_fingerprinting(requests)
-        assert "canvas" in result.get("techniques", []) or result["detected"] is False
+    assert [d['technique'] for d in detections] == ['canvas']
+    assert detections[0]['severity'] == 'high'
+    assert detections[0]['script_url'] == 'https://example.com/tracker.js'
+    assert detections[0]['evidence']['patterns_found'] == ['canvas.toDataURL']
 
 
 def test_detect_fingerprinting_webgl():
     """Test detection of WebGL fingerprinting."""
-    requests = [
-        {
-            "method": "GET",
-            "url": "https://example.com/tracker.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    detections = detect_fingerprinting('gl.getParameter(37446)', 'https://example.com/tracker.js')
     
-    with patch('builtins.open', create=True) as mock_open:
-        mock_open.return_value.__enter__.return_value.read.return_value = (
-            "getParameter(RENDERER)"
-        )
-        result = detect_fingerprinting(requests)
-        assert "webgl" in result.get("techniques", []) or result["detected"] is False
+    assert [d['technique'] for d in detections] == ['webgl']
 
 
 def test_detect_fingerprinting_audio():
     """Test detection of audio fingerprinting."""
-    requests = [
-        {
-            "method": "GET",
-            "url": "https://example.com/tracker.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    detections = detect_fingerprinting('new AudioContext().createOscillator()', 'https://example.com/tracker.js')
     
-    with patch('builtins.open', create=True) as mock_open:
-        mock_open.return_value.__enter__.return_value.read.return_value = (
-            "AudioContext channelCount"
-        )
-        result = detect_fingerprinting(requests)
-        assert "audio" in result.get("techniques", []) or result["detected"] is False
+    assert [d['technique'] for d in detections] == ['audio']
+    assert detections[0]['evidence']['total_matches'] == 2
 
 
 def test_detect_fingerprinting_multiple_techniques():
-    """Test detection of multiple fingerprinting techniques."""
-    requests = [
-        {
-            "method": "GET",
-            "url": "https://example.com/tracker.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    """Test detection of multiple fingerprinting techniques in one script."""
+    script = 'canvas.toDataURL(); gl.getParameter(37445); navigator.plugins.length'
+    detections = detect_fingerprinting(script, 'https://example.com/tracker.js')
     
-    with patch('builtins.open', create=True) as mock_open:
-        mock_open.return_value.__enter__.return_value.read.return_value = (
-            "canvas.toDataURL getParameter(RENDERER) navigator.plugins"
-        )
-        result = detect_fingerprinting(requests)
-        # Should detect multiple techniques if present
-        if result["detected"]:
-            assert len(result.get("techniques", [])) >= 1
-
-
-def test_confidence_score_increases_with_signals():
-    """Test that confidence score increases with more signals."""
-    # Single signal
-    single_signal = [
-        {
-            "method": "GET",
-            "url": "https://example.com/tracker.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    assert [d['technique'] for d in detections] == ['canvas', 'webgl', 'device']
+
+
+def test_evidence_limits_patterns_found_but_counts_all_matches():
+    """Test evidence lists at most five patterns while total_matches counts every one."""
+    script = ' '.join(FINGERPRINTING_PATTERNS['device']['patterns'])
+    detections = detect_fingerprinting(script, 'https://example.com/fp.js')
     
-    # Multiple signals
-    multiple_signals = [
-        {
-            "method": "GET",
-            "url": "https://tracker.com/fp.js",
-            "response_headers": {"content-type": "application/javascript"}
-        },
-        {
-            "method": "GET",
-            "url": "https://analytics.com/fingerprint.js",
-            "response_headers": {"content-type": "application/javascript"}
-        }
-    ]
+    evidence = detections[0]['evidence']
+    assert len(evidence['patterns_found']) == 5
+    assert evidence['total_matches'] == len(FINGERPRINTING_PATTERNS['device']['patterns'])
+
+
+def test_detect_fingerprinting_matches_reference_detector():
+    """Test the multi-pattern matcher agrees with per-pattern substring checks."""
+    for index, script in enumerate(random_scripts(1000)):
+        url = f'https://example.com/{index}.js'
+        assert detect_fingerprinting(script, url) == reference_detections(script, url)
+
+
+@pytest.mark.skipif(fingerprinting.hyperscan is None, reason='Hyperscan is not installed')
+def test_hyperscan_and_aho_corasick_agree(monkeypatch):
+    """Test the Hyperscan and Aho-Corasick matchers find the same patterns."""
+    scripts = list(random_scripts(1000, seed=99))
+    hyperscan_ids = [find_pattern_ids(script) for script in scripts]
+    
+    monkeypatch.setattr(fingerprinting, 'hyperscan', None)
+    monkeypatch.setattr(fingerprinting, 'PATTERN_AUTOMATON', build_automaton(ALL_PATTERNS), raising=False)
+    
+    assert [find_pattern_ids(script) for script in scripts] == hyperscan_ids
+
+
+def test_aho_corasick_matches_reference_detector(aho_corasick_only):
+    """Test the Aho-Corasick fallback agrees with per-pattern substring checks."""
+    for index, script in enumerate(random_scripts(500, seed=7)):
+        url = f'https://example.com/{index}.js'
+        assert detect_fingerprinting(script, url) == reference_detections(script, url)
+
+
+def test_cache_hit_returns_same_detections_for_another_url(monkeypatch):
+    """Test identical content under a different URL is served from the cache unchanged."""
+    script = 'canvas.toBlob(); navigator.hardwareConcurrency; new AudioContext()'
+    first = detect_fingerprinting(script, 'https://cdn-a.example.com/sdk.js')
+    
+    def fail_scan(*args, **kwargs):
+        raise AssertionError('cached content was scanned again')
     
-    result_single = detect_fingerprinting(single_signal)
-    result_multiple = detect_fingerprinting(multiple_signals)
+    monkeypatch.setattr(fingerprinting, 'find_pattern_ids', fail_scan)
+    second = detect_fingerprinting(script, 'https://cdn-b.example.com/sdk.js')
+    
+    assert [d['script_url'] for d in second] == ['https://cdn-b.example.com/sdk.js'] * len(first)
+    assert [{**d, 'script_url': None} for d in second] == [{**d, 'script_url': None} for d in first]
+
+
+def test_pattern_cache_evicts_least_recently_used(monkeypatch):
+    """Test the pattern cache stays bounded and keeps recently used scripts."""
+    monkeypatch.setattr(fingerprinting, 'PATTERN_CACHE_SIZE', 2)
+    cached_pattern_ids('canvas.toDataURL 1')
+    cached_pattern_ids('canvas.toDataURL 2')
+    cached_pattern_ids('canvas.toDataURL 1')
+    cached_pattern_ids('canvas.toDataURL 3')
     
-    # This is a placeholder test - actual implementation may vary
-    assert isinstance(result_single["confidence"], (int, float))
-    assert isinstance(result_multiple["confidence"], (int, float))
+    assert len(fingerprinting._pattern_cache) == 2
+    monkeypatch.setattr(fingerprinting, 'find_pattern_ids', lambda *args: pytest.fail('evicted the wrong entry'))
+    cached_pattern_ids('canvas.toDataURL 1')
+
+
+def test_aho_corasick_stops_once_every_pattern_matched(monkeypatch, aho_corasick_only):
+    """Test the Aho-Corasick scan stops consuming matches once all patterns are found."""
+    consumed = []
+    
+    class RecordingAutomaton:
+        def iter(self, script_content):
+            for pattern_id in list(range(len(ALL_PATTERNS))) * 3:
+                consumed.append(pattern_id)
+                yield 0, pattern_id
+    
+    monkeypatch.setattr(fingerprinting, 'PATTERN_AUTOMATON', RecordingAutomaton())
+    
+    assert find_pattern_ids('x') == set(range(len(ALL_PATTERNS)))
+    assert len(consumed) == len(ALL_PATTERNS)
+
+
+@pytest.mark.skipif(fingerprinting.hyperscan is None, reason='Hyperscan is not installed')
+def test_hyperscan_stops_once_every_pattern_matched(monkeypatch):
+    """Test the Hyperscan match handler halts the scan once all patterns are found."""
+    handled = []
+    
+    class RecordingDatabase:
+        def scan(self, data, match_event_handler, scratch):
+            for pattern_id in list(range(len(ALL_PATTERNS))) * 3:
+                handled.append(pattern_id)
+                if match_event_handler(pattern_id, 0, 0, 0, None):
+                    raise fingerprinting.hyperscan.ScanTerminated()
+    
+    monkeypatch.setattr(fingerprinting, 'PATTERN_DATABASE', RecordingDatabase())
+    
+    assert find_pattern_ids('x', scratch=object()) == set(range(len(ALL_PATTERNS)))
+    assert len(handled) == len(ALL_PATTERNS)
+
+
+def test_script_with_every_pattern_reports_every_technique():
+    """Test a script containing every pattern (the early-exit case) is fully reported."""
+    script = ' '.join(ALL_PATTERNS) + ' canvas.toDataURL' * 1000
+    detections = detect_fingerprinting(script, 'https://example.com/all.js')
+    
+    assert detections == reference_detections(script, 'https://example.com/all.js')
+
+
+def test_detect_fingerprinting_batch_matches_single_script_calls():
+    """Test the batch API returns each script's detections in input order."""
+    scripts = [
+        (f'https://example.com/{index}.js', script)
+        for index, script in enumerate(random_scripts(200, seed=5))
+    ]
+    
+    assert detect_fingerprinting_batch(scripts) == [
+        reference_detections(script, url) for url, script in scripts
+    ]
+    assert detect_fingerprinting_batch([]) == []
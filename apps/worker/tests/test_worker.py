@@ -0,0 +1,242 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from playwright.sync_api import Error as PlaywrightError
+import worker
+from shared.scan_cache import scan_cache_key
+from worker import FingerprintingQueue, ResponseBytes, build_graph_cache, is_request_allowed
+
+
+class FakeSession:
+    def __init__(self):
+        self.handlers = {}
+        self.sent = []
+    
+    def on(self, event, handler):
+        self.handlers[event] = handler
+    
+    def send(self, method):
+        self.sent.append(method)
+    
+    def emit(self, event, params):
+        self.handlers[event](params)
+    
+    def load(self, request_id, url, size):
+        self.emit("Network.responseReceived", {"requestId": request_id, "response": {"url": url}})
+        self.emit("Network.loadingFinished", {"requestId": request_id, "encodedDataLength": size})
+
+
+class FakeTarget:
+    def __init__(self, out_of_process=True):
+        self.out_of_process = out_of_process
+        self.handlers = {}
+    
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+
+class FakeRequest:
+    def __init__(self, url, navigation=False, main_frame=True):
+        self.url = url
+        self.navigation = navigation
+        self.frame = SimpleNamespace(parent_frame=None if main_frame else object())
+    
+    def is_navigation_request(self):
+        return self.navigation
+
+
+class FakeContext:
+    def __init__(self):
+        self.sessions = {}
+    
+    def new_cdp_session(self, target):
+        if not target.out_of_process:
+            raise PlaywrightError("This frame does not have a separate CDP session")
+        session = self.sessions[target] = FakeSession()
+        return session
+
+
+@pytest.fixture
+def context():
+    return FakeContext()
+
+
+def test_response_bytes_counts_page_responses_by_domain(context):
+    """Test encoded response sizes are summed per registered domain."""
+    page = FakeTarget()
+    response_bytes = ResponseBytes(context)
+    response_bytes.watch(page)
+    
+    session = context.sessions[page]
+    assert session.sent == ["Network.enable"]
+    session.load("1", "https://www.example.com/", 1200)
+    session.load("2", "https://cdn.example.com:8443/app.js", 300)
+    session.load("3", "https://tracker.net/pixel.gif", 45)
+    
+    assert response_bytes.by_domain == {"example.com": 1500, "tracker.net": 45}
+
+
+def test_response_bytes_counts_out_of_process_iframes(context):
+    """Test bytes loaded by a cross-origin iframe reach the per-domain totals."""
+    page = FakeTarget()
+    response_bytes = ResponseBytes(context)
+    response_bytes.watch(page)
+    
+    # Same-process frames share the page's session
+    same_origin_frame = FakeTarget(out_of_process=False)
+    page.handlers["frameattached"](same_origin_frame)
+    assert same_origin_frame not in context.sessions
+    
+    # A frame that moves out of process when it navigates is attached then,
+    # and only once however often it navigates afterwards
+    ad_frame = FakeTarget(out_of_process=False)
+    page.handlers["frameattached"](ad_frame)
+    ad_frame.out_of_process = True
+    page.handlers["framenavigated"](ad_frame)
+    page.handlers["framenavigated"](ad_frame)
+    
+    context.sessions[page].load("1", "https://example.com/", 1000)
+    context.sessions[ad_frame].load("1", "https://ads.adnetwork.com/creative.html", 5000)
+    context.sessions[ad_frame].load("2", "https://ads.adnetwork.com/banner.png", 20000)
+    
+    assert response_bytes.by_domain == {"example.com": 1000, "adnetwork.com": 25000}
+
+
+def test_response_bytes_drops_failed_requests(context):
+    """Test a request that fails after its response headers adds no bytes and isn't kept."""
+    page = FakeTarget()
+    response_bytes = ResponseBytes(context)
+    response_bytes.watch(page)
+    
+    session = context.sessions[page]
+    session.emit("Network.responseReceived", {"requestId": "1", "response": {"url": "https://example.com/video.mp4"}})
+    session.emit("Network.loadingFailed", {"requestId": "1"})
+    # A late loadingFinished for the same id must not be attributed
+    session.emit("Network.loadingFinished", {"requestId": "1", "encodedDataLength": 999})
+    
+    assert response_bytes.by_domain == {}
+
+
+def test_build_graph_cache_uses_worker_domain_rules(monkeypatch):
+    """Test the precomputed graph groups cookies and flags trackers like the rest of the scan."""
+    monkeypatch.setattr(worker, "TRACKER_DOMAINS", frozenset({"doubleclick.net"}))
+    domain_stats = {
+        "example.com": {"request_count": 3, "bytes": 900, "is_third_party": False},
+        "stats.doubleclick.net": {"request_count": 2, "bytes": 100, "is_third_party": True},
+        "192.168.0.1": {"request_count": 1, "bytes": 10, "is_third_party": True}
+    }
+    cookies = [{"domain": ".example.com"}, {"domain": "www.example.com"}, {"domain": "192.168.0.1"}]
+    
+    first_party_requests, first_party_bytes, graph = build_graph_cache("example.com", domain_stats, cookies)
+    
+    assert (first_party_requests, first_party_bytes) == (3, 900)
+    nodes = {node["id"]: node for node in graph["nodes"]}
+    assert nodes["example.com"]["cookies_count"] == 2
+    assert nodes["192.168.0.1"]["cookies_count"] == 1
+    assert nodes["192.168.0.1"]["is_tracker"] is False
+    # Subdomains of a listed tracker are flagged, as tracker_domains counts them
+    assert nodes["stats.doubleclick.net"]["is_tracker"] is True
+
+
+def test_strict_filter_allows_only_allowed_domains():
+    """Test the strict profile filter compares registered domains of the request host."""
+    allowed = {"example.com", "cdn-partner.net"}
+    
+    assert is_request_allowed(FakeRequest("https://static.example.com/app.js"), allowed)
+    assert is_request_allowed(FakeRequest("https://user:pw@img.cdn-partner.net:8443/a.png"), allowed)
+    assert not is_request_allowed(FakeRequest("https://www.google-analytics.com/collect"), allowed)
+
+
+def test_strict_filter_follows_main_frame_redirects_only():
+    """Test top-level navigations to another domain load while third-party iframes are blocked."""
+    allowed = {"example.com"}
+    
+    assert is_request_allowed(FakeRequest("https://example.co.uk/", navigation=True), allowed)
+    # The redirect target's own subresources load after it
+    assert is_request_allowed(FakeRequest("https://static.example.co.uk/app.js"), allowed)
+    assert not is_request_allowed(
+        FakeRequest("https://ads.adnetwork.com/frame.html", navigation=True, main_frame=False), allowed
+    )
+
+
+def test_invalidate_scan_cache_deletes_every_cached_view(monkeypatch):
+    """Test the worker deletes the API's cached status, report and graph for a scan."""
+    deleted = []
+    monkeypatch.setattr(worker, "redis_client", SimpleNamespace(delete=lambda *keys: deleted.extend(keys)))
+    
+    worker.invalidate_scan_cache("scan-a")
+    
+    assert deleted == [scan_cache_key("scan-a", view) for view in ("status", "report", "graph")]
+
+
+
+class FakeConnection:
+    def __init__(self, attempts):
+        self.attempts = attempts
+        self.executed = []
+    
+    def execute(self, statement, params):
+        self.executed.append((statement, params))
+        return SimpleNamespace(fetchone=lambda: ("https://example.com", "example.com", self.attempts))
+
+
+@pytest.fixture
+def start_scan(monkeypatch):
+    def start(attempts):
+        connection = FakeConnection(attempts)
+        monkeypatch.setattr(worker, "engine", SimpleNamespace(begin=lambda: nullcontext(connection)))
+        monkeypatch.setattr(worker, "invalidate_scan_cache", lambda scan_id: None)
+        return connection
+    return start
+
+
+def test_scan_lost_with_its_worker_is_run_again(monkeypatch, start_scan):
+    """Test a scan whose first run was lost with its worker starts a second run."""
+    class ScanStarted(Exception):
+        pass
+    
+    def scan_context():
+        raise ScanStarted()
+    
+    monkeypatch.setattr(worker, "scan_context", scan_context)
+    start_scan(worker.MAX_SCAN_ATTEMPTS)
+    
+    with pytest.raises(ScanStarted):
+        worker.run_scan("scan-a")
+
+
+def test_scan_that_keeps_crashing_its_worker_is_failed(monkeypatch, start_scan):
+    """Test a scan past MAX_SCAN_ATTEMPTS is marked failed instead of run again."""
+    monkeypatch.setattr(worker, "scan_context", lambda: pytest.fail("crashing scan was run again"))
+    connection = start_scan(worker.MAX_SCAN_ATTEMPTS + 1)
+    
+    with pytest.raises(Exception, match="worker was lost 2 times"):
+        worker.run_scan("scan-a")
+    
+    assert [statement for statement, _ in connection.executed] == [worker.START_SCAN, worker.FAIL_SCAN]
+    assert connection.executed[1][1]["scan_id"] == "scan-a"
+
+
+def test_fingerprinting_queue_scans_every_script_in_order():
+    """Test queued scripts, including ones added while a batch runs, are all scanned in order."""
+    queue = FingerprintingQueue()
+    scripts = [
+        (f"https://cdn{index}.example/fp.js", f"cdn{index}.example", "canvas.toDataURL(); navigator.plugins")
+        for index in range(20)
+    ]
+    for script_url, domain, script_content in scripts:
+        queue.add(script_url, domain, script_content)
+    queue.add("https://example.com/app.js", "example.com", "console.log('no fingerprinting here')")
+    
+    results = queue.detections()
+    
+    assert [(script_url, domain) for script_url, domain, _ in results] == [
+        (script_url, domain) for script_url, domain, _ in scripts
+    ] + [("https://example.com/app.js", "example.com")]
+    assert all(
+        [detection["technique"] for detection in detections] == ["canvas", "device"]
+        for _, _, detections in results[:-1]
+    )
+    assert results[-1][2] == []
@@ -1,16 +1,22 @@
 import os
-import json
-import uuid
-from datetime import datetime
-from collections import defaultdict
+import io
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from urllib.parse import urlparse
 from celery import Celery
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu.serialization import register
+import orjson
+import redis
+from sqlalchemy import Float, bindparam, column, create_engine, func, insert, table, text, update
+from sqlalchemy.dialects.postgresql import JSON, JSONB, insert as pg_insert
+from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
 import tldextract
 import boto3
-from fingerprinting import detect_fingerprinting
+from fingerprinting import detect_fingerprinting_batch, new_scratch
+from shared.scan_cache import CACHED_SCAN_VIEWS, scan_cache_key
 
 # Configuration from environment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -28,171 +34,558 @@ s3_client = boto3.client(
     aws_access_key_id=S3_ACCESS_KEY,
     aws_secret_access_key=S3_SECRET_KEY
 )
+# Screenshot uploads run here so they overlap with the scan's database writes
+s3_upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="s3-upload")
+# Scripts are scanned for fingerprinting on a background thread while the page
+# keeps loading; a single thread keeps the Hyperscan scratch and the detector's
+# LRU cache free of concurrent use
+fingerprinting_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fingerprinting")
+
+# Redis client for invalidating the API's cached scan responses
+redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+
+# Shared extractor so the public suffix list is loaded once; it is warmed at
+# import so prefork children inherit the parsed list instead of each loading
+# it on their first scan (the image bakes the list into TLDEXTRACT_CACHE)
+_tld_extract = tldextract.TLDExtract()
+_tld_extract("example.com")
+
+
+@lru_cache(maxsize=100_000)
+def extract_host(host: str):
+    # Memoized tldextract split; a page's requests (and trackers across scans)
+    # repeat a handful of hosts
+    return _tld_extract(host)
+
+
+@lru_cache(maxsize=100_000)
+def registered_domain(host: str) -> str:
+    # eTLD+1 of a host, e.g. cdn.example.co.uk -> example.co.uk; cached
+    # separately so repeat hosts skip building the string as well. IPs and
+    # bare suffixes lack one of the parts and are returned whole
+    extracted = extract_host(host)
+    return ".".join(part for part in (extracted.domain, extracted.suffix) if part)
+
 
 # Load tracker list
 TRACKER_LIST = []
 tracker_file = "/app/tracker_lists/default.json"
 if os.path.exists(tracker_file):
-    with open(tracker_file, "r") as f:
-        TRACKER_LIST = json.load(f)
+    with open(tracker_file, "rb") as f:
+        TRACKER_LIST = orjson.loads(f.read())
+TRACKER_DOMAINS = frozenset(TRACKER_LIST)
+
+
+def is_tracker_domain(domain: str) -> bool:
+    # A domain is a tracker if it or any parent domain is listed, e.g.
+    # ads.example.com matches example.com; one set lookup per label
+    while domain:
+        if domain in TRACKER_DOMAINS:
+            return True
+        domain = domain.partition(".")[2]
+    return False
+
+# orjson-backed serializer for task messages (matches apps/api/tasks.py);
+# plain JSON is still accepted for messages queued before the switch
+register(
+    "orjson",
+    orjson.dumps,
+    orjson.loads,
+    content_type="application/x-orjson",
+    content_encoding="utf-8"
+)
 
 # Celery app
 celery_app = Celery("privacy_worker", broker=REDIS_URL, backend=REDIS_URL)
 celery_app.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    task_serializer="orjson",
+    accept_content=["orjson", "json"],
+    result_serializer="orjson",
     timezone="UTC",
     enable_utc=True,
-    task_track_started=True,
+    # Scan state is written to Postgres, so skip result/STARTED writes to Redis
+    task_ignore_result=True,
+    result_expires=60,
+    # Scans run for tens of seconds: acknowledge after completion and reserve
+    # one task per child at a time (run with -Ofair, see the Dockerfile)
     task_acks_late=True,
     worker_prefetch_multiplier=1,
+    # Requeue a scan whose child died mid-run instead of dropping it (run_scan
+    # fails a scan after MAX_SCAN_ATTEMPTS, so a page that keeps crashing the
+    # browser isn't redelivered forever); the soft limit raises
+    # inside run_scan so a hung scan is marked failed, and the hard limit
+    # reclaims the child if even that doesn't return
+    task_reject_on_worker_lost=True,
+    task_soft_time_limit=270,
+    task_time_limit=300,
+    worker_disable_rate_limits=True,
+    broker_connection_retry_on_startup=True,
 )
 
 # Database setup
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Each prefork child runs one scan at a time, so a small pool is plenty;
+# recycle so long-idle workers don't hold connections Postgres has dropped.
+# Multi-row inserts (cookies, fingerprinting detections) are sent as
+# INSERT ... VALUES (...), (...) pages of this many rows, and JSON columns
+# (graph_cache, fingerprinting evidence) are encoded with orjson
+engine = create_engine(
+    DATABASE_URL, pool_size=2, max_overflow=2, pool_pre_ping=True, pool_recycle=1800,
+    insertmanyvalues_page_size=1000,
+    json_serializer=lambda value: orjson.dumps(value).decode()
+)
 
+# Lightweight Core table handles; statements built from them are defined once
+# at import so every scan reuses the engine's compiled-statement cache
+scans_table = table(
+    "scans",
+    column("id"), column("url"), column("base_domain"), column("status"), column("attempts"),
+    column("started_at"), column("finished_at"), column("final_url"),
+    column("http_status"), column("page_title"), column("total_requests"),
+    column("total_bytes"), column("third_party_domains"), column("cookies_set"),
+    column("localstorage_keys"), column("indexeddb_present"), column("tracker_domains"),
+    column("fingerprinting_count"), column("first_party_request_count"),
+    column("first_party_bytes"), column("graph_cache", JSONB), column("error_message")
+)
+_scan_by_id = scans_table.c.id == bindparam("scan_id")
+# Marks the scan running, counts the attempt and returns what the scan needs
+# to start
+START_SCAN = (
+    update(scans_table).where(_scan_by_id)
+    .values(status="running", started_at=func.now(), attempts=scans_table.c.attempts + 1)
+    .returning(scans_table.c.url, scans_table.c.base_domain, scans_table.c.attempts)
+)
+# The captured summary columns are supplied as execute() parameters
+COMPLETE_SCAN = update(scans_table).where(_scan_by_id).values(status="completed", finished_at=func.now())
+FAIL_SCAN = update(scans_table).where(_scan_by_id).values(status="failed")
 
-def calculate_privacy_score(third_party_count, cookies_count, localstorage_keys, indexeddb_present, tracker_domains, fingerprinting_count):
-    # Start with perfect score and deduct points
-    score = 100
+storage_summary_table = table(
+    "storage_summary",
+    column("scan_id"), column("localstorage_keys_count"),
+    column("indexeddb_present"), column("serviceworker_present")
+)
+artifacts_table = table("artifacts", column("scan_id"), column("kind"), column("uri"))
+
+# Batched (insertmanyvalues) row inserts
+cookies_table = table(
+    "cookies",
+    column("scan_id"), column("name"), column("domain_id"), column("path"),
+    column("expires_at"), column("is_session"), column("is_third_party")
+)
+# A cookie seen again in the same scan (name/domain/path, uq_cookie_scope)
+# updates its expiry in place instead of failing the batch. Expiry is bound
+# as Playwright's Unix timestamp and converted to UTC by Postgres
+# (to_timestamp(NULL) is NULL for session cookies)
+_cookie_insert = pg_insert(cookies_table).values(
+    expires_at=func.timezone("UTC", func.to_timestamp(bindparam("expires_epoch", type_=Float)))
+)
+COOKIE_UPSERT = _cookie_insert.on_conflict_do_update(
+    constraint="uq_cookie_scope",
+    set_={
+        "expires_at": _cookie_insert.excluded.expires_at,
+        "is_session": _cookie_insert.excluded.is_session
+    }
+)
+# Columns bulk-loaded into domain_aggregates with COPY
+DOMAIN_AGGREGATE_COLUMNS = (
+    "scan_id", "domain_id", "is_third_party", "request_count", "bytes",
+    "script_count", "image_count", "xhr_count", "font_count",
+    "css_count", "media_count", "other_count"
+)
+fingerprinting_detections_table = table(
+    "fingerprinting_detections",
+    column("scan_id"), column("technique"), column("domain"), column("script_url"),
+    column("evidence", JSON), column("severity")
+)
+
+# Scripts whose Content-Length exceeds this aren't fetched for fingerprinting
+MAX_SCRIPT_BYTES = 2_000_000
+
+# Runs a scan may start; every earlier run took its worker child down with it
+# (a finished run marks the scan completed or failed), so a scan that crashes
+# twice is failed rather than redelivered again
+MAX_SCAN_ATTEMPTS = 2
+
+# Resource kinds with their own count column (mirrors apps/api/models.py);
+# other Playwright resource types are counted as "other"
+RESOURCE_KINDS = ("script", "image", "xhr", "font", "css", "media", "other")
+RESOURCE_KIND_ALIASES = {"stylesheet": "css", "fetch": "xhr"}
+
+
+class DomainStats(dict):
+    # Per-domain request totals for a scan; a domain's entry is created on
+    # first sight without a default-factory call on every lookup
+    __slots__ = ()
     
-    # Deduct for third-party domains (up to -30 points)
-    if third_party_count > 0:
-        score -= min(30, third_party_count * 3)
+    def __missing__(self, domain):
+        stats = self[domain] = {
+            "request_count": 0,
+            "bytes": 0,
+            "is_third_party": False
+        }
+        return stats
+
+
+def is_request_allowed(request, allowed_domains):
+    # Strict-profile filter: top-level navigations always load, so a site that
+    # redirects to another registrable domain (vanity -> canonical,
+    # google.com -> google.co.uk) still scans, and the site it lands on is
+    # allowed from then on; everything else must come from an allowed domain
+    domain = registered_domain(urlparse(request.url).hostname or "")
+    if request.is_navigation_request() and request.frame.parent_frame is None:
+        allowed_domains.add(domain)
+        return True
+    return domain in allowed_domains
+
+
+class ResponseBytes:
+    # Encoded (on-the-wire) response bytes per domain, from Chromium's own
+    # network accounting: Content-Length is missing on chunked responses, while
+    # Network.loadingFinished reports the size of every response. Cross-origin
+    # iframes run out of process and report on their own CDP target, so each
+    # page and out-of-process frame gets its own session
+    def __init__(self, context):
+        self.context = context
+        self.by_domain = {}
+        self._attached = set()
     
-    # Deduct for cookies (up to -25 points)
-    if cookies_count > 0:
-        score -= min(25, cookies_count * 2)
+    def attach(self, target):
+        # Listen on a page or frame target; in-process frames share their
+        # parent's session, which Playwright signals by refusing a new one
+        if target in self._attached:
+            return
+        try:
+            session = self.context.new_cdp_session(target)
+        except PlaywrightError:
+            return
+        self._attached.add(target)
+        
+        # requestId -> domain for responses still loading on this target
+        pending = {}
+        
+        def on_response(event):
+            pending[event["requestId"]] = registered_domain(
+                urlparse(event["response"]["url"]).hostname or ""
+            )
+        
+        def on_loading_finished(event):
+            domain = pending.pop(event["requestId"], None)
+            if domain is not None:
+                self.by_domain[domain] = self.by_domain.get(domain, 0) + int(event["encodedDataLength"])
+        
+        def on_loading_failed(event):
+            pending.pop(event["requestId"], None)
+        
+        session.on("Network.responseReceived", on_response)
+        session.on("Network.loadingFinished", on_loading_finished)
+        session.on("Network.loadingFailed", on_loading_failed)
+        session.send("Network.enable")
     
-    # Deduct for localStorage usage (up to -15 points)
-    if localstorage_keys > 0:
-        score -= min(15, localstorage_keys * 3)
+    def watch(self, page):
+        # Attach to the page now and to each frame as it appears; a frame
+        # becomes out-of-process when it navigates cross-origin, so retry then
+        self.attach(page)
+        page.on("frameattached", self.attach)
+        page.on("framenavigated", self.attach)
+
+
+class FingerprintingQueue:
+    # Scripts queued for fingerprinting as they load, scanned on
+    # fingerprinting_pool in batches: the scripts that arrive while one batch
+    # is being scanned form the next, so a page's dozens of scripts cost a few
+    # pool jobs instead of one each. Only the pool thread takes from pending
+    def __init__(self):
+        self.scratch = new_scratch()
+        self.pending = deque()
+        self.batches = []
     
-    # Deduct for IndexedDB usage (-10 points)
-    if indexeddb_present:
-        score -= 10
+    def add(self, script_url, domain, script_content):
+        self.pending.append((script_url, domain, script_content))
+        # A batch still running may already have drained pending; detections()
+        # scans anything left behind
+        if not self.batches or self.batches[-1].done():
+            self.batches.append(fingerprinting_pool.submit(self._scan_pending))
+    
+    def _scan_pending(self):
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        found = detect_fingerprinting_batch(
+            [(script_url, script_content) for script_url, _, script_content in batch], self.scratch
+        )
+        return [(script_url, domain, detections) for (script_url, domain, _), detections in zip(batch, found)]
+    
+    def detections(self):
+        # (script_url, domain, detections) for every queued script, in order
+        self.batches.append(fingerprinting_pool.submit(self._scan_pending))
+        return [result for batch in self.batches for result in batch.result()]
+
+
+def resource_counts(breakdown):
+    # Fold a {resource_type: count} map into the domain_aggregates count columns
+    counts = dict.fromkeys(RESOURCE_KINDS, 0)
+    for kind, count in breakdown.items():
+        kind = RESOURCE_KIND_ALIASES.get(kind, kind)
+        counts[kind if kind in counts else "other"] += count
+    return {f"{kind}_count": count for kind, count in counts.items()}
+
+
+INTERN_DOMAINS = text("""INSERT INTO domains (name) SELECT unnest(CAST(:names AS text[]))
+                          ON CONFLICT (name) DO NOTHING""")
+DOMAIN_IDS = text("SELECT name, id FROM domains WHERE name = ANY(:names)")
+
+
+def intern_domains(conn, names):
+    # Map domain names to their shared domains.id, adding any new names.
+    # DO NOTHING keeps concurrent scans race-free without rewriting existing rows
+    names = list(set(names))
+    if not names:
+        return {}
+    conn.execute(INTERN_DOMAINS, {"names": names})
+    rows = conn.execute(DOMAIN_IDS, {"names": names})
+    return dict(rows.all())
+
+
+# COPY text-format escapes for the characters that delimit fields and rows
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_value(value):
+    # Render one value in COPY's text format (NULL is \N)
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_rows(conn, table_name, columns, rows):
+    # Bulk-load rows with COPY ... FROM STDIN on the scan's own connection
+    # (so it commits with the rest of the scan); skips per-row INSERT parsing
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(row[name]) for name in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+    with conn.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+# One Chromium per worker process, launched once and reused by every scan;
+# each scan still gets its own isolated BrowserContext
+_playwright = None
+_browser = None
+# Headless Chromium flags: hide the automation marker from sites that check it,
+# use /tmp instead of Docker's small /dev/shm, and skip subsystems a scan never
+# needs. Playwright already passes --no-sandbox (chromium_sandbox defaults off)
+CHROMIUM_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-translate",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio"
+]
+
+
+def get_browser():
+    # Launch lazily (and again if Chromium died) so non-prefork pools work too
+    global _playwright, _browser
+    if _browser is None or not _browser.is_connected():
+        if _playwright is None:
+            _playwright = sync_playwright().start()
+        _browser = _playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+    return _browser
+
+
+@worker_process_init.connect
+def launch_browser(**kwargs):
+    get_browser()
+
+
+@worker_process_shutdown.connect
+def close_browser(**kwargs):
+    global _playwright, _browser
+    if _browser is not None:
+        _browser.close()
+        _browser = None
+    if _playwright is not None:
+        _playwright.stop()
+        _playwright = None
+
+
+@contextmanager
+def scan_context():
+    # Fresh cookies, storage and cache for one scan, closed when it ends
+    context = get_browser().new_context(
+        viewport={"width": 1920, "height": 1080},
+        user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    )
+    try:
+        yield context
+    finally:
+        context.close()
+
+
+def invalidate_scan_cache(scan_id: str):
+    # Drop cached API responses so pollers see the new scan state immediately
+    try:
+        redis_client.delete(*(scan_cache_key(scan_id, view) for view in CACHED_SCAN_VIEWS))
+    except redis.RedisError:
+        pass
+
+
+def build_graph_cache(base_domain, domain_stats, cookies):
+    # Precompute the API's /graph payload (same shape as GraphResponse) so it
+    # can be served from the scans row instead of re-aggregating child rows
+    first_party_requests = sum(s["request_count"] for s in domain_stats.values() if not s["is_third_party"])
+    first_party_bytes = sum(s["bytes"] for s in domain_stats.values() if not s["is_third_party"])
     
-    # Deduct heavily for known trackers (up to -20 points)
-    if tracker_domains > 0:
-        score -= min(20, tracker_domains * 10)
+    cookies_by_domain = defaultdict(int)
+    for cookie in cookies:
+        cookies_by_domain[registered_domain(cookie.get("domain", "").lstrip("."))] += 1
     
-    # Deduct for fingerprinting techniques (up to -25 points)
-    if fingerprinting_count > 0:
-        score -= min(25, fingerprinting_count * 8)
+    nodes = [{
+        "id": base_domain,
+        "domain": base_domain,
+        "is_third_party": False,
+        "request_count": first_party_requests,
+        "bytes": first_party_bytes,
+        "cookies_count": cookies_by_domain.get(base_domain, 0),
+        "is_tracker": False
+    }]
+    edges = []
+    for domain, stats in domain_stats.items():
+        if not stats["is_third_party"]:
+            continue
+        nodes.append({
+            "id": domain,
+            "domain": domain,
+            "is_third_party": True,
+            "request_count": stats["request_count"],
+            "bytes": stats["bytes"],
+            "cookies_count": cookies_by_domain.get(domain, 0),
+            "is_tracker": is_tracker_domain(domain)
+        })
+        edges.append({"source": base_domain, "target": domain})
     
-    return max(0, score)
+    return first_party_requests, first_party_bytes, {"nodes": nodes, "edges": edges}
 
 
-@celery_app.task(name="run_scan")
-def run_scan(scan_id: str, strict_config: dict):
+@celery_app.task(name="run_scan", ignore_result=True)
+def run_scan(scan_id: str, block_third_party: bool = False, allowlist_domains: list = ()):
     # Collects all requests, tracks third-party domains, aggregates by domain
-    # strict_config will be used in later steps for blocking third-party requests
+    # block_third_party/allowlist_domains are the strict profile settings:
+    # third-party requests outside the allowlist are aborted in the browser
     
-    db = SessionLocal()
     try:
-        # Get the URL and base domain from the database
-        result = db.execute(
-            text("SELECT url, base_domain FROM scans WHERE id = :id"),
-            {"id": scan_id}
-        )
-        row = result.fetchone()
+        # Mark the scan running and read its URL and base domain in one round-trip
+        # (the web UI polls for the running state, so it is committed up front)
+        with engine.begin() as conn:
+            row = conn.execute(START_SCAN, {"scan_id": scan_id}).fetchone()
         if not row:
             raise ValueError(f"Scan {scan_id} not found")
+        if row[2] > MAX_SCAN_ATTEMPTS:
+            raise Exception(f"Scan interrupted: its worker was lost {row[2] - 1} times")
+        invalidate_scan_cache(scan_id)
         
         target_url = row[0]
-        base_domain = row[1]
+        # Normalize once so the per-response and per-cookie party checks are
+        # plain string comparisons
+        base_domain = row[1].lower().lstrip(".")
+        base_domain_suffix = "." + base_domain
         
-        # Update status to running
-        db.execute(
-            text("UPDATE scans SET status = :status, started_at = :started_at WHERE id = :id"),
-            {"status": "running", "started_at": datetime.utcnow(), "id": scan_id}
-        )
-        db.commit()
-        
-        # Network tracking data structures
-        requests_data = []
-        domain_stats = defaultdict(lambda: {
-            "request_count": 0,
-            "bytes": 0,
-            "is_third_party": False,
-            "resource_breakdown": defaultdict(int)
-        })
+        # Network tracking data structures; the scan totals are accumulated as
+        # responses arrive
+        totals = {"requests": 0}
+        third_party_domains = set()
+        domain_stats = DomainStats()
+        # {(domain, resource_type): count}, grouped per domain only at flush
+        resource_type_counts = {}
         
-        # Launch Playwright browser
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--disable-blink-features=AutomationControlled', '--disable-dev-shm-usage']
-            )
-            context = browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+        # Open a context on the worker's shared browser
+        with scan_context() as context:
+            if block_third_party:
+                # Abort blocked requests before they leave the browser, so they
+                # cost no bandwidth and never hold up the page load
+                allowed_domains = {base_domain}
+                allowed_domains.update(registered_domain(d.lower().lstrip(".")) for d in allowlist_domains)
+                
+                def handle_route(route):
+                    if is_request_allowed(route.request, allowed_domains):
+                        route.continue_()
+                    else:
+                        route.abort()
+                
+                context.route("**/*", handle_route)
+            
             page = context.new_page()
             
-            # Set up network request/response listeners
-            def handle_request(request):
-                requests_data.append({
-                    "url": request.url,
-                    "method": request.method,
-                    "resource_type": request.resource_type,
-                    "timestamp": datetime.utcnow()
-                })
+            # Set up the network listener; each response carries its request, so
+            # one handler covers stats and fingerprinting. Scripts are queued for
+            # scanning as they arrive and only their detections are kept, not
+            # their bodies (identical bodies from other URLs hit the cache)
+            scanned_script_urls = set()
+            fingerprinting_queue = FingerprintingQueue()
             
             def handle_response(response):
-                # Find the matching request data
-                for req in requests_data:
-                    if req["url"] == response.url and "status" not in req:
-                        req["status"] = response.status
-                        req["size"] = 0
-                        
-                        # Try to get response size from headers
-                        headers = response.headers
-                        if "content-length" in headers:
-                            try:
-                                req["size"] = int(headers["content-length"])
-                            except (ValueError, TypeError):
-                                pass
-                        
-                        # Extract domain using tldextract
-                        parsed = urlparse(response.url)
-                        extracted = tldextract.extract(parsed.netloc)
-                        domain = f"{extracted.domain}.{extracted.suffix}" if extracted.suffix else extracted.domain
-                        
-                        # Determine if third-party
-                        is_third_party = domain != base_domain
-                        
-                        # Aggregate by domain
-                        domain_stats[domain]["request_count"] += 1
-                        domain_stats[domain]["bytes"] += req["size"]
-                        domain_stats[domain]["is_third_party"] = is_third_party
-                        domain_stats[domain]["resource_breakdown"][req["resource_type"]] += 1
-                        break
+                resource_type = response.request.resource_type
+                
+                # Extract domain using tldextract
+                domain = registered_domain(urlparse(response.url).netloc)
+                
+                # Determine if third-party
+                is_third_party = domain != base_domain
+                
+                # Aggregate by domain (bytes come from response_bytes below)
+                stats = domain_stats[domain]
+                stats["request_count"] += 1
+                stats["is_third_party"] = is_third_party
+                key = (domain, resource_type)
+                resource_type_counts[key] = resource_type_counts.get(key, 0) + 1
+                
+                totals["requests"] += 1
+                if is_third_party:
+                    third_party_domains.add(domain)
+                
+                # Detect browser fingerprinting in JavaScript, skipping bundles
+                # too large to be worth pulling across
+                script_url = response.url
+                if resource_type != "script" or script_url in scanned_script_urls:
+                    return
+                try:
+                    if int(response.headers.get("content-length", 0)) > MAX_SCRIPT_BYTES:
+                        return
+                except ValueError:
+                    pass
+                scanned_script_urls.add(script_url)
+                try:
+                    script_content = response.text()
+                except:
+                    return
+                fingerprinting_queue.add(script_url, domain, script_content)
             
-            page.on("request", handle_request)
             page.on("response", handle_response)
             
-            # Collect JavaScript content for fingerprinting analysis
-            script_contents = {}
-            
-            def handle_script_response(response):
-                if response.request.resource_type == "script":
-                    try:
-                        script_contents[response.url] = response.text()
-                    except:
-                        pass
-            
-            page.on("response", handle_script_response)
+            # Per-domain bytes are folded into domain_stats after navigation,
+            # since CDP events aren't ordered against Playwright's response events
+            response_bytes = ResponseBytes(context)
+            response_bytes.watch(page)
             
             try:
                 # Navigate to URL - use 'load' instead of 'networkidle' for faster results
                 # 'load' fires when initial page load completes, much faster than waiting for all network activity
                 response = page.goto(target_url, wait_until="load", timeout=10000)
                 
-                # Wait a brief period to capture most third-party requests (reduced for speed)
-                page.wait_for_timeout(500)  # 500ms grace period
+                # Give late third-party requests a bounded chance to fire; pages
+                # with long-polling widgets never go idle, so don't wait them out
+                try:
+                    page.wait_for_load_state("networkidle", timeout=5000)
+                except PlaywrightTimeoutError:
+                    pass
                 
                 # Capture final URL after redirects
                 final_url = page.url
@@ -203,71 +596,58 @@ def run_scan(scan_id: str, strict_config: dict):
                 cookies = context.cookies()
                 cookies_set = len(cookies)
                 
-                # Step 5: Check localStorage and IndexedDB
-                localstorage_keys = page.evaluate("() => Object.keys(localStorage).length")
-                indexeddb_present = page.evaluate("""() => {
-                    return new Promise((resolve) => {
-                        if (!window.indexedDB) {
-                            resolve(false);
-                            return;
-                        }
-                        const request = indexedDB.databases();
-                        request.then(dbs => resolve(dbs.length > 0))
-                              .catch(() => resolve(false));
-                    });
+                # Step 5: Check localStorage, IndexedDB and service workers in one
+                # round-trip to the page
+                storage = page.evaluate("""async () => {
+                    let indexeddb = false;
+                    if (window.indexedDB) {
+                        try {
+                            indexeddb = (await indexedDB.databases()).length > 0;
+                        } catch (e) {}
+                    }
+                    return {
+                        localstorage: Object.keys(localStorage).length,
+                        indexeddb: indexeddb,
+                        serviceworker: 'serviceWorker' in navigator && navigator.serviceWorker.controller !== null
+                    };
                 }""")
-                serviceworker_present = page.evaluate("() => 'serviceWorker' in navigator && navigator.serviceWorker.controller !== null")
+                localstorage_keys = storage["localstorage"]
+                indexeddb_present = storage["indexeddb"]
+                serviceworker_present = storage["serviceworker"]
                 
                 # Calculate totals
-                total_requests = len([r for r in requests_data if "status" in r])
-                total_bytes = sum(domain_stats[d]["bytes"] for d in domain_stats)
-                third_party_count = len([d for d in domain_stats if domain_stats[d]["is_third_party"]])
+                # (total_bytes sums the per-domain rows that are persisted)
+                total_requests = totals["requests"]
+                third_party_count = len(third_party_domains)
+                for domain, stats in domain_stats.items():
+                    stats["bytes"] = response_bytes.by_domain.get(domain, 0)
+                total_bytes = sum(stats["bytes"] for stats in domain_stats.values())
                 
                 # Step 6: Check for known trackers
-                tracker_domains = 0
-                for domain in domain_stats:
-                    if domain_stats[domain]["is_third_party"]:
-                        for tracker in TRACKER_LIST:
-                            if domain.endswith(tracker):
-                                tracker_domains += 1
-                                break
-                
-                # Step 6.5: Detect browser fingerprinting
-                all_fingerprinting_detections = []
-                for script_url, script_content in script_contents.items():
-                    detections = detect_fingerprinting(script_content, script_url)
-                    for detection in detections:
-                        # Extract domain from script URL
-                        parsed = urlparse(script_url)
-                        extracted = tldextract.extract(parsed.netloc)
-                        script_domain = f"{extracted.domain}.{extracted.suffix}" if extracted.suffix else extracted.domain
-                        
-                        all_fingerprinting_detections.append({
-                            'technique': detection['technique'],
-                            'severity': detection['severity'],
-                            'domain': script_domain,
-                            'script_url': script_url,
-                            'evidence': detection['evidence']
-                        })
+                tracker_domains = sum(1 for domain in third_party_domains if is_tracker_domain(domain))
                 
+                # Step 6.5: Collect the fingerprinting detected as scripts loaded
+                all_fingerprinting_detections = [
+                    {
+                        'technique': detection['technique'],
+                        'severity': detection['severity'],
+                        'domain': domain,
+                        'script_url': script_url,
+                        'evidence': detection['evidence']
+                    }
+                    for script_url, domain, detections in fingerprinting_queue.detections()
+                    for detection in detections
+                ]
                 fingerprinting_count = len(all_fingerprinting_detections)
                 
-                # Calculate privacy score
-                privacy_score = calculate_privacy_score(
-                    third_party_count, 
-                    cookies_set, 
-                    localstorage_keys, 
-                    indexeddb_present,
-                    tracker_domains,
-                    fingerprinting_count
-                )
-                
                 # Step 7: Take screenshot and upload to MinIO
                 screenshot_bytes = page.screenshot(full_page=False)
                 screenshot_filename = f"{scan_id}/screenshot.png"
                 
-                # Upload to MinIO
-                s3_client.put_object(
+                # Upload to MinIO in the background; awaited before the artifact
+                # row is written
+                screenshot_upload = s3_upload_pool.submit(
+                    s3_client.put_object,
                     Bucket=S3_BUCKET,
                     Key=screenshot_filename,
                     Body=screenshot_bytes,
@@ -275,24 +655,17 @@ def run_scan(scan_id: str, strict_config: dict):
                 )
                 screenshot_url = f"{S3_PUBLIC_BASE}/{screenshot_filename}"
                 
-                # Update scan with captured data
-                db.execute(
-                    text("""UPDATE scans 
-                            SET status = :status, 
-                                final_url = :final_url,
-                                http_status = :http_status,
-                                page_title = :page_title,
-                                total_requests = :total_requests,
-                                total_bytes = :total_bytes,
-                                third_party_domains = :third_party_domains,
-                                cookies_set = :cookies_set,
-                                localstorage_keys = :localstorage_keys,
-                                indexeddb_present = :indexeddb_present,
-                                privacy_score = :privacy_score,
-                                finished_at = :finished_at 
-                            WHERE id = :id"""),
-                    {
-                        "status": "completed",
+                # Graph summary is immutable once the scan finishes
+                first_party_requests, first_party_bytes, graph_cache = build_graph_cache(
+                    base_domain, domain_stats, cookies
+                )
+                
+                # Update scan with captured data; this and every row below are
+                # written in one transaction, so the scan only reads as
+                # completed once all of its results are visible
+                with engine.begin() as conn:
+                    conn.execute(COMPLETE_SCAN, {
+                        "scan_id": scan_id,
                         "final_url": final_url,
                         "http_status": http_status,
                         "page_title": page_title,
@@ -302,131 +675,103 @@ def run_scan(scan_id: str, strict_config: dict):
                         "cookies_set": cookies_set,
                         "localstorage_keys": localstorage_keys,
                         "indexeddb_present": indexeddb_present,
-                        "privacy_score": privacy_score,
-                        "finished_at": datetime.utcnow(),
-                        "id": scan_id
-                    }
-                )
-                db.commit()
-                
-                # Insert cookies into database
-                for cookie in cookies:
-                    # Parse expiration timestamp
-                    expires_at = None
-                    is_session = True
-                    if "expires" in cookie and cookie["expires"] != -1:
-                        # Playwright returns expires as Unix timestamp
-                        expires_at = datetime.fromtimestamp(cookie["expires"])
-                        is_session = False
+                        "tracker_domains": tracker_domains,
+                        "fingerprinting_count": fingerprinting_count,
+                        "first_party_request_count": first_party_requests,
+                        "first_party_bytes": first_party_bytes,
+                        "graph_cache": graph_cache
+                    })
                     
-                    # Determine if third-party cookie
-                    cookie_domain = cookie.get("domain", "").lstrip(".")
-                    is_third_party = not cookie_domain.endswith(base_domain)
+                    # Resolve cookie and aggregate domain names to interned ids
+                    domain_ids = intern_domains(
+                        conn, [cookie.get("domain", "") for cookie in cookies] + list(domain_stats)
+                    )
                     
-                    db.execute(
-                        text("""INSERT INTO cookies 
-                                (id, scan_id, name, domain, path, expires_at, is_session, is_third_party)
-                                VALUES (:id, :scan_id, :name, :domain, :path, :expires_at, :is_session, :is_third_party)"""),
-                        {
-                            "id": str(uuid.uuid4()),
+                    # Upsert cookies in one batched statement, keyed by their scope
+                    # (a row can't be updated twice in one ON CONFLICT statement)
+                    cookie_rows = {}
+                    for cookie in cookies:
+                        # Playwright returns expires as a Unix timestamp, -1 for session cookies
+                        expires_epoch = cookie.get("expires", -1)
+                        if expires_epoch == -1:
+                            expires_epoch = None
+                        
+                        # Determine if third-party cookie; match on a label boundary
+                        # so e.g. evilfoo.com isn't treated as first-party for foo.com
+                        cookie_domain = cookie.get("domain", "").lower().lstrip(".")
+                        is_third_party = not (
+                            cookie_domain == base_domain or cookie_domain.endswith(base_domain_suffix)
+                        )
+                        
+                        row = {
                             "scan_id": scan_id,
                             "name": cookie.get("name", ""),
-                            "domain": cookie.get("domain", ""),
+                            "domain_id": domain_ids[cookie.get("domain", "")],
                             "path": cookie.get("path", "/"),
-                            "expires_at": expires_at,
-                            "is_session": is_session,
+                            "expires_epoch": expires_epoch,
+                            "is_session": expires_epoch is None,
                             "is_third_party": is_third_party
                         }
-                    )
-                db.commit()
-                
-                # Insert storage summary
-                db.execute(
-                    text("""INSERT INTO storage_summary 
-                            (scan_id, localstorage_keys_count, indexeddb_present, serviceworker_present)
-                            VALUES (:scan_id, :localstorage_keys_count, :indexeddb_present, :serviceworker_present)"""),
-                    {
+                        cookie_rows[row["name"], row["domain_id"], row["path"]] = row
+                    if cookie_rows:
+                        conn.execute(COOKIE_UPSERT, list(cookie_rows.values()))
+                    
+                    # Insert storage summary
+                    conn.execute(insert(storage_summary_table), {
                         "scan_id": scan_id,
                         "localstorage_keys_count": localstorage_keys,
                         "indexeddb_present": indexeddb_present,
                         "serviceworker_present": serviceworker_present
-                    }
-                )
-                db.commit()
-                
-                # Insert domain aggregates
-                for domain, stats in domain_stats.items():
-                    resource_json = json.dumps(dict(stats["resource_breakdown"]))
-                    db.execute(
-                        text("""INSERT INTO domain_aggregates 
-                                (id, scan_id, domain, is_third_party, request_count, bytes, resource_breakdown)
-                                VALUES (:id, :scan_id, :domain, :is_third_party, :request_count, :bytes, CAST(:resource_breakdown AS jsonb))"""),
+                    })
+                    
+                    # Bulk-load domain aggregates with COPY
+                    breakdowns = defaultdict(dict)
+                    for (domain, resource_type), count in resource_type_counts.items():
+                        breakdowns[domain][resource_type] = count
+                    domain_rows = [
                         {
-                            "id": str(uuid.uuid4()),
                             "scan_id": scan_id,
-                            "domain": domain,
+                            "domain_id": domain_ids[domain],
                             "is_third_party": stats["is_third_party"],
                             "request_count": stats["request_count"],
                             "bytes": stats["bytes"],
-                            "resource_breakdown": resource_json
+                            **resource_counts(breakdowns[domain])
                         }
-                    )
-                db.commit()
-                
-                # Insert screenshot artifact
-                db.execute(
-                    text("""INSERT INTO artifacts 
-                            (id, scan_id, kind, uri, created_at)
-                            VALUES (:id, :scan_id, :kind, :uri, :created_at)"""),
-                    {
-                        "id": str(uuid.uuid4()),
+                        for domain, stats in domain_stats.items()
+                    ]
+                    if domain_rows:
+                        copy_rows(conn, "domain_aggregates", DOMAIN_AGGREGATE_COLUMNS, domain_rows)
+                    
+                    # Insert screenshot artifact once its upload has landed
+                    screenshot_upload.result(timeout=30)
+                    conn.execute(insert(artifacts_table), {
                         "scan_id": scan_id,
                         "kind": "screenshot",
-                        "uri": screenshot_url,
-                        "created_at": datetime.utcnow()
-                    }
-                )
-                
-                # Insert fingerprinting detections
-                for detection in all_fingerprinting_detections:
-                    db.execute(
-                        text("""INSERT INTO fingerprinting_detections 
-                                (id, scan_id, technique, domain, script_url, evidence, severity, created_at)
-                                VALUES (:id, :scan_id, :technique, :domain, :script_url, CAST(:evidence AS jsonb), :severity, :created_at)"""),
-                        {
-                            "id": str(uuid.uuid4()),
-                            "scan_id": scan_id,
-                            "technique": detection['technique'],
-                            "domain": detection['domain'],
-                            "script_url": detection['script_url'],
-                            "evidence": json.dumps(detection['evidence']),
-                            "severity": detection['severity'],
-                            "created_at": datetime.utcnow()
-                        }
-                    )
+                        "uri": screenshot_url
+                    })
+                    
+                    # Insert fingerprinting detections in one batched statement
+                    if all_fingerprinting_detections:
+                        conn.execute(insert(fingerprinting_detections_table), [
+                            {"scan_id": scan_id, **detection}
+                            for detection in all_fingerprinting_detections
+                        ])
                 
-                db.commit()
+                invalidate_scan_cache(scan_id)
                 
             except PlaywrightTimeoutError as e:
                 raise Exception(f"Timeout loading page: {str(e)}")
-            finally:
-                browser.close()
         
         return {"scan_id": scan_id, "status": "completed", "total_requests": total_requests}
         
     except Exception as e:
-        db.rollback()
         # Update status to failed
-        db.execute(
-            text("UPDATE scans SET status = :status, error_message = :error_message WHERE id = :id"),
-            {"status": "failed", "error_message": str(e), "id": scan_id}
-        )
-        db.commit()
+        with engine.begin() as conn:
+            conn.execute(FAIL_SCAN, {"scan_id": scan_id, "error_message": str(e)})
+        invalidate_scan_cache(scan_id)
         raise
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
-    # Start worker with: celery -A worker worker --loglevel=info
+    # Start worker with: celery -A worker worker --loglevel=info -Ofair --concurrency=<N>
     pass
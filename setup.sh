@@ -72,7 +72,7 @@ echo "[OK] Dependencies installed"
 echo ""
 echo "Verifying API code..."
 cd apps/api
-python verify.py
+PYTHONPATH=.. python verify.py  # ../shared is imported by the API
 cd ../..
 
 echo ""